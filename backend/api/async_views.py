@@ -0,0 +1,229 @@
+"""Асинхронные представления для чтения рецептов и ингредиентов.
+
+Под ASGI (uvicorn) они обслуживают GET-запросы к /api/recipes/ и
+/api/ingredients/: запросы к базе идут через асинхронный ORM Django,
+и пока процесс ждет базу или медленного клиента, он принимает другие
+запросы. Ответы, ETag и кеш для анонимных пользователей те же, что у
+RecipeViewSet и IngredientViewSet. Запись, курсорную пагинацию и
+просмотр API в браузере по-прежнему обслуживают синхронные ViewSet.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.authentication import CachedTokenAuthentication
+from api.caching import add_etag, make_etag, response_cache_key
+from api.filters import RecipeFilter
+from api.pagination import (
+    CURSOR_PAGINATION,
+    PAGINATION_QUERY_PARAM,
+    PageLimitPagination
+)
+from api.serializers import IngredientSerializer, RecipeSerializer
+from api.views import (
+    IngredientViewSet,
+    RecipeViewSet,
+    recipe_cache_versions,
+    recipe_etag_versions,
+    recipe_queryset
+)
+from core.db_router import use_primary
+from core.ingredient_index import get_ingredient_index
+from core.models import Ingredient
+from core.versions import INGREDIENTS_VERSION, get_version
+
+READ_METHODS = ('GET', 'HEAD')
+RENDERER_FORMAT = JSONRenderer.format
+
+
+class Failed(Exception):
+    """Ответ с ошибкой в формате DRF."""
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    response = HttpResponse(
+        JSONRenderer().render(data),
+        status=status_code,
+        content_type='application/json',
+    )
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+async def authenticate(request):
+    """Пользователь по заголовку Authorization, как в синхронном API."""
+    try:
+        result = await sync_to_async(
+            CachedTokenAuthentication().authenticate)(request)
+    except exceptions.AuthenticationFailed as e:
+        raise Failed(status.HTTP_401_UNAUTHORIZED, {'detail': e.detail})
+    return result[0] if result is not None else AnonymousUser()
+
+
+async def conditional(request, etag_versions, build, cache_versions=None,
+                      action=None):
+    """Ответ build() с ETag; для анонимных - из кеша, если задан action.
+
+    build() возвращает данные ответа или бросает Failed.
+    """
+    etag = make_etag(etag_versions, request.user, RENDERER_FORMAT,
+                     request.get_full_path())
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return add_etag(not_modified, etag)
+    if action is None or request.user.is_authenticated:
+        # Как и в синхронном API, ответ с ETag строится по основной базе
+        with use_primary():
+            data = await build()
+    else:
+        key = response_cache_key('recipes', action, cache_versions,
+                                 request.get_full_path())
+        data = await cache.aget(key)
+        if data is None:
+            with use_primary():
+                data = await build()
+            await cache.aset(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+    return add_etag(render(data), etag)
+
+
+async def paginate(request, queryset):
+    """Асинхронный аналог PageLimitPagination.paginate_queryset.
+
+    Возвращает пагинатор DRF с загруженной страницей.
+    """
+    pagination = PageLimitPagination()
+    pagination.request = request
+    paginator = pagination.django_paginator_class(
+        queryset, pagination.get_page_size(request))
+    # Число объектов считается асинхронно, Paginator берет готовое
+    paginator.count = await queryset.acount()
+    try:
+        page = paginator.page(
+            pagination.get_page_number(request, paginator))
+    except InvalidPage:
+        raise Failed(status.HTTP_404_NOT_FOUND,
+                     {'detail': pagination.invalid_page_message})
+    page.object_list = [item async for item in page.object_list]
+    pagination.page = page
+    return pagination
+
+
+async def recipe_list(request):
+    filterset = RecipeFilter(
+        request.query_params, recipe_queryset(request.user), request=request)
+
+    async def build():
+        # Проверка фильтра по автору обращается к базе
+        if not await sync_to_async(filterset.is_valid)():
+            raise Failed(status.HTTP_400_BAD_REQUEST, filterset.errors)
+        pagination = await paginate(request, filterset.qs)
+        serializer = RecipeSerializer(
+            pagination.page.object_list, many=True,
+            context={'request': request})
+        return pagination.get_paginated_response(serializer.data).data
+
+    versions = recipe_cache_versions()
+    return await conditional(
+        request, recipe_etag_versions(request.user, versions), build,
+        versions, 'list')
+
+
+async def recipe_detail(request, pk):
+    async def build():
+        recipe = await aget_object_or_404(recipe_queryset(request.user), pk=pk)
+        return RecipeSerializer(recipe, context={'request': request}).data
+
+    versions = recipe_cache_versions(pk)
+    return await conditional(
+        request, recipe_etag_versions(request.user, versions), build,
+        versions, 'retrieve')
+
+
+async def ingredient_list(request):
+    async def build():
+        # Индекс перестраивается запросом к базе после изменений
+        index = await sync_to_async(get_ingredient_index)()
+        name = request.query_params.get('name')
+        return index.search(name) if name else index.items
+
+    return await conditional(
+        request, (get_version(INGREDIENTS_VERSION),), build)
+
+
+async def ingredient_detail(request, pk):
+    async def build():
+        ingredient = await aget_object_or_404(Ingredient, pk=pk)
+        return IngredientSerializer(ingredient).data
+
+    return await conditional(
+        request, (get_version(INGREDIENTS_VERSION),), build)
+
+
+def uses_sync_view(request):
+    """Запросы, которые обслуживает синхронный ViewSet."""
+    return (
+        request.method not in READ_METHODS
+        or request.GET.get(PAGINATION_QUERY_PARAM) == CURSOR_PAGINATION
+        or 'format' in request.GET
+        or 'text/html' in request.headers.get('Accept', '')
+    )
+
+
+def async_read_view(async_view, sync_view):
+    """Представление: чтение - асинхронно, остальное - синхронным ViewSet."""
+    sync_view = sync_to_async(sync_view)
+
+    @csrf_exempt
+    @wraps(async_view)
+    async def view(request, *args, **kwargs):
+        if uses_sync_view(request):
+            return await sync_view(request, *args, **kwargs)
+        request = Request(request)
+        try:
+            request.user = await authenticate(request)
+            return await async_view(request, *args, **kwargs)
+        except Failed as e:
+            return render(e.data, e.status_code)
+        except Http404 as e:
+            # Текст ошибки тот же, что отдает DRF
+            return render({'detail': str(e)}, status.HTTP_404_NOT_FOUND)
+
+    return view
+
+
+recipes = async_read_view(
+    recipe_list,
+    RecipeViewSet.as_view({'get': 'list', 'post': 'create'},
+                          basename='recipes', detail=False),
+)
+recipe = async_read_view(
+    recipe_detail,
+    RecipeViewSet.as_view({'get': 'retrieve', 'put': 'update',
+                           'patch': 'partial_update', 'delete': 'destroy'},
+                          basename='recipes', detail=True),
+)
+ingredients = async_read_view(
+    ingredient_list,
+    IngredientViewSet.as_view({'get': 'list'},
+                              basename='ingredients', detail=False),
+)
+ingredient = async_read_view(
+    ingredient_detail,
+    IngredientViewSet.as_view({'get': 'retrieve'},
+                              basename='ingredients', detail=True),
+)
@@ -0,0 +1,98 @@
+"""Аутентификация по токену с кешем в памяти процесса.
+
+TokenAuthentication читает токен вместе с пользователем из базы на каждом
+запросе. Здесь найденная пара хранится в LRU-кеше процесса не дольше
+AUTH_TOKEN_CACHE_TTL секунд. Запись действительна, пока не изменилась
+версия аутентификации пользователя (core.versions): ее меняют выход из
+системы, смена пароля, деактивация и правка учетной записи. Изменения
+в обход сигналов (QuerySet.update) проявятся не позже чем через TTL.
+
+Версии видны другим процессам, только если кеш Django общий. С кешем
+в памяти процесса (LocMemCache) выход или деактивация в одном процессе
+не сбросят записи в остальных, поэтому там запись кеша дополнительно
+проверяется одним запросом: токен существует и пользователь активен.
+"""
+import copy
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core.versions import (
+    auth_version_name, get_version, versions_are_shared
+)
+
+_tokens = OrderedDict()
+_lock = Lock()
+
+
+def clear_token_cache():
+    """Очищает кеш токенов текущего процесса."""
+    with _lock:
+        _tokens.clear()
+
+
+def _cached(key):
+    with _lock:
+        entry = _tokens.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _tokens[key]
+            return None
+        _tokens.move_to_end(key)
+        return entry
+
+
+def _store(key, entry):
+    with _lock:
+        _tokens[key] = entry
+        _tokens.move_to_end(key)
+        while len(_tokens) > settings.AUTH_TOKEN_CACHE_SIZE:
+            _tokens.popitem(last=False)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, которая не ходит в базу при повторных запросах.
+
+    Каждому запросу отдаются копии пользователя и токена, чтобы изменения
+    объектов в одном запросе не попадали в другие.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = _cached(key)
+        if entry is not None:
+            _, version, token = entry
+            if (get_version(auth_version_name(token.user_id)) == version
+                    and self.still_valid(token)):
+                return self.copy_credentials(token)
+        user_id = (
+            self.get_model().objects.filter(key=key)
+            .values_list('user_id', flat=True).first()
+        )
+        if user_id is None:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        # Версия читается до пользователя: если учетную запись изменят
+        # между этими чтениями, запись кеша сразу окажется устаревшей
+        version = get_version(auth_version_name(user_id))
+        user, token = super().authenticate_credentials(key)
+        _store(key, (time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL,
+                     version, token))
+        return self.copy_credentials(token)
+
+    def still_valid(self, token):
+        """Проверяет по базе запись кеша, если версии не общие."""
+        if versions_are_shared():
+            return True
+        return self.get_model().objects.filter(
+            key=token.key, user_id=token.user_id, user__is_active=True
+        ).exists()
+
+    @staticmethod
+    def copy_credentials(token):
+        token = copy.copy(token)
+        token.user = copy.copy(token.user)
+        return token.user, token
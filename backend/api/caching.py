@@ -0,0 +1,120 @@
+"""Кеширование ответов API и условные GET-запросы.
+
+Ключ кеша и ETag строятся из версий данных (core.versions) и полного
+пути запроса с параметрами. Версии меняются при записи данных, поэтому
+устаревший ответ никогда не отдается: он просто перестает совпадать.
+"""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers
+)
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.db_router import use_primary
+
+RESPONSE_KEY = 'response:{basename}:{action}:{versions}:{path}'
+
+
+def response_cache_key(basename, action, versions, path):
+    """Ключ кеша ответа действия action для полного пути path."""
+    return RESPONSE_KEY.format(
+        basename=basename,
+        action=action,
+        versions='.'.join(map(str, versions)),
+        path=md5(path.encode()).hexdigest(),
+    )
+
+
+def make_etag(versions, user, renderer_format, path):
+    """ETag ответа по версиям данных, пользователю, формату и пути."""
+    value = ':'.join((
+        '.'.join(map(str, versions)),
+        str(user.pk if user.is_authenticated else ''),
+        renderer_format,
+        path,
+    ))
+    return f'"{md5(value.encode()).hexdigest()}"'
+
+
+def add_etag(response, etag):
+    response['ETag'] = etag
+    # Ответ зависит от пользователя, браузер должен его перепроверять
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+class AnonymousResponseCacheMixin:
+    """Кеширует ответы list и retrieve для анонимных пользователей.
+
+    ViewSet определяет get_cache_versions() - список версий данных,
+    от которых зависит ответ текущего действия.
+    """
+
+    def get_cache_versions(self):
+        raise NotImplementedError
+
+    def get_cache_key(self, request):
+        return response_cache_key(
+            self.basename, self.action, self.get_cache_versions(),
+            request.get_full_path())
+
+    def dispatch_cached(self, request, handler, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        # Ответ будет отдаваться до смены версии, поэтому строится
+        # по основной базе, а не по возможно отставшей реплике
+        with use_primary():
+            response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.dispatch_cached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.dispatch_cached(
+            request, super().retrieve, *args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 Not Modified, если ETag клиента совпал с текущим.
+
+    ETag считается по версиям данных без сериализации ответа, поэтому
+    повторный опрос неизменившегося ресурса не трогает БД. Ответ с ETag
+    строится по основной базе. ViewSet определяет get_etag_versions()
+    для текущего действия.
+    """
+
+    def get_etag_versions(self):
+        raise NotImplementedError
+
+    def get_etag(self, request):
+        return make_etag(
+            self.get_etag_versions(), request.user,
+            request.accepted_renderer.format, request.get_full_path())
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        etag = self.get_etag(request)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is None:
+            # ETag новой версии нельзя давать ответу по отставшей реплике:
+            # клиент получал бы 304 на устаревшие данные до следующей записи
+            with use_primary():
+                response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        else:
+            response = not_modified
+        return add_etag(response, etag)
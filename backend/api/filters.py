@@ -1,6 +1,7 @@
 from django.db.models import OuterRef, Exists
 from django_filters import rest_framework
 from core.models import ShoppingCart, Favorite, Recipe
+from core.search import search_recipes
 
 
 class RecipeFilter(rest_framework.FilterSet):
@@ -12,6 +13,7 @@ class RecipeFilter(rest_framework.FilterSet):
     is_in_shopping_cart = rest_framework.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = rest_framework.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
@@ -46,3 +48,8 @@ class RecipeFilter(rest_framework.FilterSet):
         return queryset.filter(in_cart_exists) if value else queryset.exclude(
             in_cart_exists
         )
+
+    def filter_search(self, queryset, name, value):
+        # Самые релевантные рецепты первыми, при равенстве - новые
+        return search_recipes(queryset, value).order_by(
+            '-search_rank', '-date_published', '-id')
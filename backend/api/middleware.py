@@ -0,0 +1,70 @@
+from hashlib import md5
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from core.db_router import use_replicas
+
+API_PREFIX = '/api/'
+PRIMARY_KEY = 'read_primary:{}'
+
+
+class ReplicaMiddleware:
+    """Направляет безопасные запросы к API на реплики базы данных.
+
+    После запроса на запись клиент READ_YOUR_WRITES_SECONDS секунд
+    читает с основной базы, чтобы видеть свои изменения до того, как они
+    дойдут до реплик. Отметка хранится в кеше по заголовку Authorization.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Под ASGI асинхронные представления не уходят в поток
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.acall(request)
+        if not request.path.startswith(API_PREFIX):
+            return self.get_response(request)
+        key = self.primary_key(request)
+        if request.method in SAFE_METHODS:
+            with use_replicas(not self.pinned(key)):
+                return self.get_response(request)
+        response = self.get_response(request)
+        self.pin(key)
+        return response
+
+    async def acall(self, request):
+        if not request.path.startswith(API_PREFIX):
+            return await self.get_response(request)
+        key = self.primary_key(request)
+        if request.method in SAFE_METHODS:
+            with use_replicas(not self.pinned(key)):
+                return await self.get_response(request)
+        response = await self.get_response(request)
+        self.pin(key)
+        return response
+
+    @staticmethod
+    def pinned(key):
+        return key is not None and cache.get(key) is not None
+
+    @staticmethod
+    def pin(key):
+        if key is not None:
+            cache.set(key, True, settings.READ_YOUR_WRITES_SECONDS)
+
+    @staticmethod
+    def primary_key(request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        return PRIMARY_KEY.format(md5(authorization.encode()).hexdigest())
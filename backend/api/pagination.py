@@ -1,7 +1,51 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+PAGINATION_QUERY_PARAM = 'pagination'
+CURSOR_PAGINATION = 'cursor'
 
 
 class PageLimitPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
     max_page_size = 100
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная пагинация ленты рецептов по (date_published, id).
+
+    Не считает COUNT(*) и не использует OFFSET, поэтому любая страница
+    стоит столько же, сколько первая.
+    """
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-date_published', '-id')
+
+
+class UserCursorPagination(RecipeCursorPagination):
+    ordering = ('username', 'id')
+
+
+class CursorOptInMixin:
+    """Включает курсорную пагинацию по параметру ?pagination=cursor.
+
+    Параметры из cursor_incompatible_params задают свой порядок выдачи,
+    с ними остается обычная постраничная пагинация.
+    """
+
+    cursor_pagination_class = None
+    cursor_incompatible_params = ()
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            use_cursor = (
+                params.get(PAGINATION_QUERY_PARAM) == CURSOR_PAGINATION
+                and not any(params.get(param)
+                            for param in self.cursor_incompatible_params)
+            )
+            if use_cursor and self.cursor_pagination_class is not None:
+                self._paginator = self.cursor_pagination_class()
+        return super().paginator
@@ -1,10 +1,18 @@
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from core.models import (
     Ingredient, Recipe, RecipeIngredient,
     Favorite, ShoppingCart, User, Subscription
 )
+from core.recipe_index import invalidate_recipe_index
+from core.shopping_cart_totals import refresh_recipe_totals
+from core.similarity import schedule_similar_recipes
+from api.uploads import UploadImageField
 
 
 # Константы для валидации
@@ -13,11 +21,12 @@ MIN_AMOUNT = 1
 MAX_AMOUNT = 32000
 MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 32000
+MAX_BATCH_SIZE = 100
 
 
 class CustomUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
-    avatar = Base64ImageField(required=False, allow_null=True)
+    avatar = UploadImageField(required=False, allow_null=True)
 
     class Meta:
         model = User
@@ -27,6 +36,8 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if not request:
             return False
@@ -45,10 +56,42 @@ class CustomUserSerializer(UserSerializer):
         return representation
 
 
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения: {размер: {формат: url}}.
+
+    Пока копии строятся в фоне, возвращается пустой словарь.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        variants = {}
+        for variant, formats in recipe.get_image_variants().items():
+            variants[variant] = {}
+            for image_format, path in formats.items():
+                url = default_storage.url(path)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[variant][image_format] = url
+        return variants
+
+
+def get_recipes_limit(request):
+    """Возвращает лимит рецептов автора из параметра recipes_limit."""
+    try:
+        return max(int(request.GET.get('recipes_limit',
+                                       DEFAULT_RECIPES_LIMIT)), 0)
+    except (TypeError, ValueError):
+        return DEFAULT_RECIPES_LIMIT
+
+
 class AuthorWithRecipesSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='recipes.count',
-                                             read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -58,9 +101,11 @@ class AuthorWithRecipesSerializer(CustomUserSerializer):
         )
 
     def get_recipes(self, obj):
-        request = self.context['request']
-        recipes_limit = request.GET.get('recipes_limit', DEFAULT_RECIPES_LIMIT)
-        recipes = obj.recipes.all()[:int(recipes_limit)]
+        # Рецепты страницы подписок загружены заранее в limited_recipes
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()[
+                :get_recipes_limit(self.context['request'])]
         return CompactRecipeSerializer(recipes, many=True,
                                        context=self.context).data
 
@@ -71,8 +116,30 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class IngredientPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """Ингредиент по id из загруженных заранее одним запросом.
+
+    RecipeSerializer кладет их в context['ingredients']; без них поле
+    работает как обычный PrimaryKeyRelatedField. Ошибки те же.
+    """
+
+    def to_internal_value(self, data):
+        ingredients = self.context.get('ingredients')
+        if ingredients is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = Ingredient._meta.pk.to_python(data)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in ingredients:
+            self.fail('does_not_exist', pk_value=data)
+        return ingredients[pk]
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = IngredientPrimaryKeyField(queryset=Ingredient.objects.all())
     name = serializers.CharField(source='ingredient.name', read_only=True)
     amount = serializers.IntegerField(
         min_value=MIN_AMOUNT, max_value=MAX_AMOUNT)
@@ -94,18 +161,52 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.SerializerMethodField()
     cooking_time = serializers.IntegerField(
         min_value=MIN_COOKING_TIME, max_value=MAX_COOKING_TIME)
-    image = Base64ImageField(allow_null=True)
+    image = UploadImageField(allow_null=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time'
+            'name', 'image', 'image_variants', 'text', 'cooking_time'
         )
 
+    def to_internal_value(self, data):
+        if hasattr(data, 'getlist'):
+            # multipart/form-data: ингредиенты передаются строкой JSON
+            data = data.dict()
+            if isinstance(data.get('ingredients'), str):
+                try:
+                    data['ingredients'] = json.loads(data['ingredients'])
+                except ValueError:
+                    raise serializers.ValidationError(
+                        {'ingredients': ['Некорректный JSON.']})
+        self.context['ingredients'] = self.load_ingredients(
+            data.get('ingredients'))
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def load_ingredients(items):
+        """Загружает одним запросом все ингредиенты из входных данных."""
+        if not isinstance(items, list):
+            return {}
+        ids = set()
+        for item in items:
+            if not isinstance(item, dict) or isinstance(item.get('id'), bool):
+                continue
+            try:
+                ids.add(Ingredient._meta.pk.to_python(item.get('id')))
+            except DjangoValidationError:
+                continue
+        ids.discard(None)
+        return Ingredient.objects.in_bulk(ids) if ids else {}
+
     @staticmethod
     def save_recipe_ingredients(recipe, data):
+        # bulk_create не отправляет сигналы
+        invalidate_recipe_index([recipe.pk])
+        schedule_similar_recipes([recipe.pk])
         RecipeIngredient.objects.bulk_create([
             RecipeIngredient(
                 recipe=recipe,
@@ -116,18 +217,71 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         ingredients_data = validated_data.pop('recipe_ingredients')
-        recipe = super().create(validated_data)
-        self.save_recipe_ingredients(recipe, ingredients_data)
+        with transaction.atomic():
+            recipe = super().create(validated_data)
+            self.save_recipe_ingredients(recipe, ingredients_data)
         return recipe
 
+    @staticmethod
+    def update_recipe_ingredients(recipe, data):
+        """Приводит состав рецепта к data, меняя только отличающиеся строки.
+
+        Вызывается в транзакции: блокировка рецепта не дает параллельным
+        изменениям считать разницу от одного и того же состава.
+        """
+        Recipe.objects.select_for_update().get(pk=recipe.pk)
+        current = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        wanted = {item['id'].pk: item['amount'] for item in data}
+        removed = current.keys() - wanted.keys()
+        added = wanted.keys() - current.keys()
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = wanted.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient__in=removed).delete()
+        if added:
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                                 amount=wanted[ingredient_id])
+                for ingredient_id in added
+            )
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added or changed:
+            # bulk_create и bulk_update не отправляют сигналы; итоги
+            # корзин по удаленным строкам пересчитывают сигналы удаления
+            refresh_recipe_totals(
+                recipe, added | {row.ingredient_id for row in changed})
+        if added:
+            # Количества в индекс не входят
+            invalidate_recipe_index([recipe.pk])
+            schedule_similar_recipes([recipe.pk])
+
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('recipe_ingredients', None)
         validated_ingredients = self.validate_ingredients(ingredients_data)
-        instance.recipe_ingredients.all().delete()
-        self.save_recipe_ingredients(instance, validated_ingredients)
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            self.update_recipe_ingredients(instance, validated_ingredients)
+            # Версию рецепта для кеша обновляет сигнал сохранения рецепта
+            return super().update(instance, validated_data)
+
+    def to_representation(self, recipe):
+        # Подписка на автора посчитана аннотацией вместе с рецептом
+        if hasattr(recipe, 'is_author_subscribed'):
+            recipe.author.is_subscribed = recipe.is_author_subscribed
+        return super().to_representation(recipe)
 
     def get_is_in_shopping_cart(self, recipe):
+        # Значение уже посчитано аннотацией в RecipeViewSet.get_queryset
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         request = self.context.get('request')
         if not request or not hasattr(request, 'user'):
             return False
@@ -136,6 +290,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         return request.user.shopping_carts.filter(recipe=recipe).exists()
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         request = self.context.get('request')
         if not request or not hasattr(request, 'user'):
             return False
@@ -161,8 +317,54 @@ class RecipeSerializer(serializers.ModelSerializer):
         return image
 
 
+class CookableRecipeSerializer(RecipeSerializer):
+    """Рецепт с числом ингредиентов, которых не хватает пользователю."""
+
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('missing_count',)
+
+
+class SimilarRecipeSerializer(RecipeSerializer):
+    """Рецепт со схожестью состава с исходным (от 0 до 1)."""
+
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('similarity',)
+
+
 class CompactRecipeSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = fields
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE,
+    )
+
+    def validate_ids(self, value):
+        # Повторы убираются с сохранением порядка
+        return list(dict.fromkeys(value))
+
+
+class IngredientSetSerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE,
+    )
+    max_missing = serializers.IntegerField(
+        min_value=0, required=False, allow_null=True)
@@ -1,36 +1,132 @@
+"""Рендереры списка покупок.
+
+Каждый рендерер отдает список покупок по частям (генератором), поэтому
+ответ начинает скачиваться сразу и не собирается целиком в памяти.
+Формат выбирается параметром ?format=, по умолчанию - txt.
+"""
+import csv
+from io import BytesIO
+
+from django.conf import settings
 from django.utils.timezone import now
-from io import StringIO
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+PDF_FONT_NAME = 'ShoppingListFont'
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок."""
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Через render проходят только ответы с ошибками (401, 404 и т.п.),
+        # они отдаются в JSON с соответствующим Content-Type
+        response = (renderer_context or {}).get('response')
+        if response is not None and response.status_code >= 400:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data, renderer_context=renderer_context)
 
+    def stream(self, user, ingredients, recipes):
+        """Возвращает итератор по частям файла со списком покупок."""
+        raise NotImplementedError
 
-def generate_shopping_list(user, ingredients, recipes):
-    """Создает текстовый список покупок для пользователя."""
-    try:
-        header = (
+
+class TxtShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, user, ingredients, recipes):
+        yield (
             f"Список покупок для {user.username}\n"
-            f"Составлен: {now().strftime('%d-%m-%Y %H:%M:%S')}\n"
+            f"Составлен: {now().strftime('%d-%m-%Y %H:%M:%S')}\n\n"
+            "Продукты:\n\n"
         )
+        for idx, item in enumerate(ingredients, start=1):
+            yield (
+                f"{idx}. {item['ingredient__name'].capitalize()} "
+                f"({item['ingredient__measurement_unit']}) - "
+                f"{item['total_amount']}\n"
+            )
+        yield '\nРецепты, использующие эти продукты:\n\n'
+        for recipe in recipes:
+            yield f"- {recipe.name} (@{recipe.author.username})\n"
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class CsvShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, user, ingredients, recipes):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(('Продукт', 'Единица измерения', 'Количество'))
+        for item in ingredients:
+            yield writer.writerow((
+                item['ingredient__name'],
+                item['ingredient__measurement_unit'],
+                item['total_amount'],
+            ))
+
+
+class PdfShoppingListRenderer(ShoppingListRenderer):
+    """PDF собирается reportlab целиком, поэтому отдается одним куском."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_size = 11
+    line_height = 16
+    margin = 50
+
+    def stream(self, user, ingredients, recipes):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.pdfgen import canvas
+
+        if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT))
+
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        _, height = A4
+        y = height - self.margin
+        for chunk in TxtShoppingListRenderer().stream(
+                user, ingredients, recipes):
+            for line in chunk.rstrip('\n').split('\n'):
+                if y < self.margin:
+                    pdf.showPage()
+                    y = height - self.margin
+                pdf.setFont(PDF_FONT_NAME, self.font_size)
+                pdf.drawString(self.margin, y, line)
+                y -= self.line_height
+        pdf.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_LIST_RENDERERS = (
+    TxtShoppingListRenderer,
+    CsvShoppingListRenderer,
+    PdfShoppingListRenderer,
+)
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """Выбирает формат только по ?format=, игнорируя заголовок Accept."""
 
-        product_list = [
-            f"{idx}. {item['ingredient__name'].capitalize()} "
-            f"({item['ingredient__measurement_unit']}) - {item['total_amount']}"
-            for idx, item in enumerate(ingredients, start=1)
-        ]
-
-        recipe_list = [
-            f"- {recipe.name} (@{recipe.author.username})"
-            for recipe in recipes
-        ]
-
-        final_text = '\n'.join([
-            header,
-            'Продукты:\n',
-            *product_list,
-            '\nРецепты, использующие эти продукты:\n',
-            *recipe_list,
-        ])
-
-        # Возвращаем StringIO объект вместо строки
-        return StringIO(final_text)
-    except Exception as e:
-        # В случае ошибки возвращаем пустой список
-        return StringIO("Ошибка при создании списка покупок")
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format_query = format_suffix or request.query_params.get(
+            self.settings.URL_FORMAT_OVERRIDE)
+        if format_query:
+            # Для неизвестного формата filter_renderers вернет 404
+            renderers = self.filter_renderers(renderers, format_query)
+        return renderers[0], renderers[0].media_type
@@ -0,0 +1,95 @@
+"""Загрузка изображений файлом (multipart/form-data) и в base64.
+
+Файлы из multipart Django пишет на диск частями (см.
+FILE_UPLOAD_MAX_MEMORY_SIZE), а размер и число пикселей проверяются по
+заголовкам до полного декодирования изображения.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import MultiPartParser
+
+# Запас на остальные поля формы и границы multipart
+MULTIPART_OVERHEAD = 64 * 1024
+ALLOWED_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос.'
+    default_code = 'request_too_large'
+
+
+class LimitedMultiPartParser(MultiPartParser):
+    """Отклоняет слишком большой multipart-запрос до чтения тела."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length > settings.IMAGE_UPLOAD_MAX_SIZE + MULTIPART_OVERHEAD:
+            raise RequestTooLarge()
+        return super().parse(stream, media_type, parser_context)
+
+
+def validate_upload_size(size):
+    """Проверяет размер загружаемого файла в байтах."""
+    if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise serializers.ValidationError(
+            'Размер файла превышает '
+            f'{filesizeformat(settings.IMAGE_UPLOAD_MAX_SIZE)}.'
+        )
+
+
+def base64_decoded_size(data):
+    """Размер данных base64 после декодирования, без самого декодирования."""
+    encoded = data.split(';base64,')[-1]
+    return len(encoded) * 3 // 4
+
+
+def validate_image_upload(file):
+    """Проверяет размер файла и изображения по заголовку.
+
+    Возвращает формат изображения (JPEG, PNG, ...).
+    """
+    validate_upload_size(file.size)
+    try:
+        # Image.open читает только заголовок, пиксели не декодируются
+        with Image.open(file) as image:
+            width, height = image.size
+            image_format = image.format
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise serializers.ValidationError('Загрузите корректное изображение.')
+    finally:
+        file.seek(0)
+    if image_format not in ALLOWED_IMAGE_FORMATS:
+        raise serializers.ValidationError('Недопустимый формат изображения.')
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise serializers.ValidationError(
+            'Слишком большое разрешение изображения.')
+    return image_format
+
+
+class UploadImageField(Base64ImageField):
+    """Изображение строкой base64 или файлом из multipart/form-data."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            image_format = validate_image_upload(data)
+            # Имя от клиента не используется, как и для base64
+            data.name = f'{uuid.uuid4()}.{image_format.lower()}'
+            return serializers.ImageField.to_internal_value(self, data)
+        if isinstance(data, str):
+            validate_upload_size(base64_decoded_size(data))
+        file = super().to_internal_value(data)
+        if file is not None:
+            validate_image_upload(file)
+        return file
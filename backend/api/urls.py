@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from api.views import CustomUserViewSet, RecipeViewSet, IngredientViewSet
@@ -11,3 +12,14 @@ urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    from api import async_views
+
+    # Чтение рецептов и ингредиентов под ASGI, остальное - ViewSet выше
+    urlpatterns = [
+        path('recipes/', async_views.recipes),
+        path('recipes/<int:pk>/', async_views.recipe),
+        path('ingredients/', async_views.ingredients),
+        path('ingredients/<int:pk>/', async_views.ingredient),
+    ] + urlpatterns
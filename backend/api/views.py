@@ -2,6 +2,7 @@ from django.urls import reverse
 from rest_framework import viewsets, status, permissions
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser
 from rest_framework.response import Response
 from rest_framework import status
 from django.core.files.base import ContentFile
@@ -9,7 +10,7 @@ from django.http import Http404
 import base64
 from core.models import (
     User, Ingredient, Recipe,
-    Favorite, ShoppingCart, Subscription,
+    Favorite, ShoppingCart, ShoppingCartTotal, Subscription,
     RecipeIngredient
 )
 from api.serializers import (
@@ -17,25 +18,68 @@ from api.serializers import (
     IngredientSerializer,
     RecipeSerializer,
     CompactRecipeSerializer,
-    AuthorWithRecipesSerializer
+    AuthorWithRecipesSerializer,
+    CookableRecipeSerializer,
+    IngredientSetSerializer,
+    RecipeIdsSerializer,
+    SimilarRecipeSerializer,
+    get_recipes_limit
 )
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from api.pagination import PageLimitPagination
+from api.pagination import (
+    CursorOptInMixin,
+    PageLimitPagination,
+    RecipeCursorPagination,
+    UserCursorPagination
+)
 from api.filters import RecipeFilter
 from django.core.exceptions import ValidationError
 from djoser.views import UserViewSet
 from rest_framework import serializers
+from api.caching import AnonymousResponseCacheMixin, ConditionalGetMixin
 from api.permissions import IsOwnerOrReadOnly
-from api.shopping_cart_render import generate_shopping_list
-from django.http import FileResponse
-from django.db.models import Sum
+from api.uploads import (
+    LimitedMultiPartParser,
+    base64_decoded_size,
+    validate_image_upload,
+    validate_upload_size
+)
+from api.shopping_cart_render import (
+    SHOPPING_LIST_RENDERERS,
+    ShoppingListNegotiation
+)
+from core.feed import feed_recipes
+from core.ingredient_index import get_ingredient_index
+from core.recipe_index import get_recipe_index
+from core.recipe_relations import add_recipes, remove_recipes
+from core.versions import (
+    INGREDIENTS_VERSION,
+    RECIPES_VERSION,
+    get_version,
+    recipe_version_name,
+    user_version_name
+)
+from django.http import StreamingHttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Value
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(ConditionalGetMixin, CursorOptInMixin, UserViewSet):
     """Расширенный ViewSet для работы с пользователями через Djoser"""
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
+    cursor_pagination_class = UserCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_subscribed=Exists(Subscription.objects.filter(
+                    user=user, author=OuterRef('pk')))
+            )
+        return queryset
 
     def get_permissions(self):
         """Настройка разрешений для разных действий"""
@@ -45,10 +89,33 @@ class CustomUserViewSet(UserViewSet):
             permission_classes = [permissions.AllowAny]
         return [permission() for permission in permission_classes]
 
-    @action(detail=False, methods=['put'], url_path='me/avatar')
+    def get_etag_versions(self):
+        return (get_version(user_version_name(self.request.user.pk)),)
+
+    @action(['get', 'put', 'patch', 'delete'], detail=False)
+    def me(self, request, *args, **kwargs):
+        if request.method == 'GET':
+            return self.conditional_response(
+                request, super().me, *args, **kwargs)
+        return super().me(request, *args, **kwargs)
+
+    @action(detail=False, methods=['put'], url_path='me/avatar',
+            parser_classes=[JSONParser, LimitedMultiPartParser])
     def avatar(self, request):
-        """Установка аватара пользователя."""
+        """Установка аватара пользователя (base64 или файлом)."""
         user = request.user
+        upload = request.FILES.get('avatar')
+        if upload is not None:
+            try:
+                image_format = validate_image_upload(upload)
+            except serializers.ValidationError as e:
+                return Response({'avatar': e.detail},
+                                status=status.HTTP_400_BAD_REQUEST)
+            upload.name = f'avatar{user.id}.{image_format.lower()}'
+            user.avatar = upload
+            user.save()
+            return Response({'avatar': user.avatar.url})
+
         data = request.data.get('avatar')
 
         if not data:
@@ -60,6 +127,11 @@ class CustomUserViewSet(UserViewSet):
         except ValueError:
             return Response({'avatar': ['Недопустимый формат аватарки']},
                             status=status.HTTP_400_BAD_REQUEST)
+        try:
+            validate_upload_size(base64_decoded_size(imgstr))
+        except serializers.ValidationError as e:
+            return Response({'avatar': e.detail},
+                            status=status.HTTP_400_BAD_REQUEST)
 
         try:
             ext = format.split('/')[-1]
@@ -109,15 +181,18 @@ class CustomUserViewSet(UserViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        _, created = Subscription.objects.get_or_create(
-            user=request.user, author=author
-        )
-        if not created:
+        # Повторную подписку отсекает уникальное ограничение в БД,
+        # в том числе при параллельных запросах
+        try:
+            with transaction.atomic():
+                Subscription.objects.create(user=request.user, author=author)
+        except IntegrityError:
             return Response(
                 {'errors': f'Вы уже подписаны на пользователя {author.username}.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        author.is_subscribed = True
         return Response(
             AuthorWithRecipesSerializer(
                 author, context={'request': request}).data,
@@ -134,29 +209,31 @@ class CustomUserViewSet(UserViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        # Сначала проверяем существование автора
-        author = get_object_or_404(User, pk=id)
-
-        try:
-            subscription = Subscription.objects.get(
-                user=request.user, author=author)
-            subscription.delete()
+        deleted, _ = Subscription.objects.filter(
+            user=request.user, author_id=id).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
-        except Subscription.DoesNotExist:
-            return Response(
-                {'errors': 'Подписка не найдена.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # Существование автора проверяем, только если подписки не было
+        get_object_or_404(User, pk=id)
+        return Response(
+            {'errors': 'Подписка не найдена.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
     @action(detail=False, methods=['get'])
     def subscriptions(self, request):
         """Получение списка подписок."""
         try:
-            subscriptions = Subscription.objects.filter(
-                user=request.user
-            ).select_related('author')
-
-            queryset = [sub.author for sub in subscriptions]
+            # Пагинация выполняется в БД, число рецептов - из счетчика,
+            # а рецепты всех авторов страницы грузятся одним оконным запросом
+            queryset = User.objects.filter(
+                authors__user=request.user
+            ).annotate(is_subscribed=Value(True)).prefetch_related(Prefetch(
+                'recipes',
+                queryset=Recipe.objects.order_by('-date_published')[
+                    :get_recipes_limit(request)],
+                to_attr='limited_recipes',
+            ))
 
             page = self.paginate_queryset(queryset)
             if page is not None:
@@ -174,29 +251,107 @@ class CustomUserViewSet(UserViewSet):
             )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+def recipe_queryset(user):
+    """План загрузки рецептов для list, retrieve и ответов create/update.
+
+    Автор подтягивается JOIN-ом, ингредиенты - одним prefetch-запросом,
+    а флаги текущего пользователя - подзапросами Exists, поэтому
+    число запросов не зависит от размера страницы и числа ингредиентов.
+    """
+    queryset = Recipe.objects.select_related('author').prefetch_related(
+        Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        )
+    )
+    if user.is_authenticated:
+        # Флаги считаются для всей страницы одним запросом,
+        # сериализатор читает готовые значения
+        queryset = queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_author_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+    return queryset
+
+
+def recipe_cache_versions(recipe_id=None):
+    """Версии данных списка рецептов или рецепта recipe_id."""
+    if recipe_id is not None:
+        return (get_version(INGREDIENTS_VERSION),
+                get_version(recipe_version_name(recipe_id)))
+    return (get_version(INGREDIENTS_VERSION), get_version(RECIPES_VERSION))
+
+
+def recipe_etag_versions(user, versions):
+    if user.is_authenticated:
+        # Флаги избранного, корзины и подписки зависят от пользователя
+        versions += (get_version(user_version_name(user.pk)),)
+    return versions
+
+
+class RecipeViewSet(ConditionalGetMixin, AnonymousResponseCacheMixin,
+                    CursorOptInMixin, viewsets.ModelViewSet):
     """ViewSet для работы с рецептами."""
 
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     pagination_class = PageLimitPagination
+    cursor_pagination_class = RecipeCursorPagination
+    cursor_incompatible_params = ('search',)
+    parser_classes = (JSONParser, LimitedMultiPartParser, FormParser)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = [permissions.IsAuthenticatedOrReadOnly,
                           IsOwnerOrReadOnly]
 
+    def get_queryset(self):
+        return recipe_queryset(self.request.user)
+
+    def get_cache_versions(self):
+        return recipe_cache_versions(
+            self.kwargs['pk'] if self.action == 'retrieve' else None)
+
+    def get_etag_versions(self):
+        return recipe_etag_versions(
+            self.request.user, self.get_cache_versions())
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().retrieve, *args, **kwargs)
+
+    def reload_for_response(self, serializer):
+        """Перечитывает сохраненный рецепт по плану загрузки для ответа."""
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        self.reload_for_response(serializer)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.reload_for_response(serializer)
 
     @staticmethod
     def manage_recipe_relation(model, user, recipe_id, add=True):
         """Универсальный метод для работы с избранным и корзиной"""
-        # Не перехватываем Http404 - пусть она поднимается выше
-        recipe = get_object_or_404(Recipe, pk=recipe_id)
-
         if add:
-            _, created = model.objects.get_or_create(user=user, recipe=recipe)
-            if not created:
+            # Рецепт нужен для ответа; Http404 поднимается выше
+            recipe = get_object_or_404(Recipe, pk=recipe_id)
+            # Повтор отсекает уникальное ограничение в БД, в том числе
+            # при параллельных запросах
+            try:
+                with transaction.atomic():
+                    model.objects.create(user=user, recipe=recipe)
+            except IntegrityError:
                 return Response(
                     {'errors': f'Рецепт "{recipe.name}" уже добавлен.'},
                     status=status.HTTP_400_BAD_REQUEST
@@ -204,16 +359,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(CompactRecipeSerializer(recipe).data,
                             status=status.HTTP_201_CREATED)
 
-        try:
-            relation = model.objects.get(user=user, recipe=recipe)
-            relation.delete()
+        # Итоги корзины и счетчики обновляют сигналы удаления
+        deleted, _ = model.objects.filter(
+            user=user, recipe_id=recipe_id).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
-        except model.DoesNotExist:
-            model_name = "избранного" if model == Favorite else "корзины"
-            return Response(
-                {'errors': f'Рецепт не найден в {model_name}.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # Существование рецепта проверяем, только если связи не было
+        get_object_or_404(Recipe, pk=recipe_id)
+        model_name = "избранного" if model == Favorite else "корзины"
+        return Response(
+            {'errors': f'Рецепт не найден в {model_name}.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
     @action(detail=True, methods=['post'],
             permission_classes=[IsAuthenticated])
@@ -233,36 +390,129 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def remove_shopping_cart(self, request, pk=None):
         return self.manage_recipe_relation(ShoppingCart, request.user, pk, False)
 
+    @action(detail=False, methods=['get'], url_path='by_ingredients')
+    def by_ingredients(self, request):
+        """Рецепты из имеющихся ингредиентов.
+
+        Ингредиенты передаются списком id через запятую: сначала идут
+        рецепты, для которых есть все, затем те, где не хватает одного,
+        и так далее.
+        """
+        ingredients = ','.join(request.query_params.getlist('ingredients'))
+        params = IngredientSetSerializer(data={
+            'ingredients': [
+                value for value in ingredients.split(',') if value.strip()
+            ],
+            'max_missing': request.query_params.get('max_missing'),
+        })
+        params.is_valid(raise_exception=True)
+        recipe_ids, missing = get_recipe_index().match(
+            params.validated_data['ingredients'],
+            params.validated_data.get('max_missing'),
+        )
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(
+            list(zip(recipe_ids.tolist(), missing.tolist())), request, self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in page])
+        results = []
+        for recipe_id, missing_count in page:
+            # Индекс может отставать от удаленных только что рецептов
+            if recipe_id in recipes:
+                recipes[recipe_id].missing_count = missing_count
+                results.append(recipes[recipe_id])
+        serializer = CookableRecipeSerializer(
+            results, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated])
-    def download_shopping_cart(self, request):
-        """Скачивание списка покупок."""
-        try:
-            user = request.user
-            ingredients = (
-                RecipeIngredient.objects
-                .filter(recipe__shopping_carts__user=user)
-                .values('ingredient__name', 'ingredient__measurement_unit')
-                .annotate(total_amount=Sum('amount'))
-                .order_by('ingredient__name')
-            )
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь.
+
+        Лента собирается заранее (см. core.feed) и всегда отдается
+        с курсорной пагинацией, от новых рецептов к старым.
+        """
+        paginator = RecipeCursorPagination()
+        page = paginator.paginate_queryset(
+            feed_recipes(request.user, self.get_queryset()), request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Рецепты с самым близким составом ингредиентов.
+
+        Списки похожих рассчитаны заранее (см. core.similarity).
+        """
+        recipe = get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+        recipes = self.get_queryset().filter(
+            similar_to__recipe=recipe,
+        ).annotate(
+            similarity=F('similar_to__score'),
+        ).order_by('-similarity', '-id')
+        serializer = SimilarRecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
 
-            recipes = user.shopping_carts.all()
+    @staticmethod
+    def manage_recipe_batch(model, request):
+        """Пакетное добавление и удаление для избранного и корзины."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        handler = add_recipes if request.method == 'POST' else remove_recipes
+        results = handler(
+            model, request.user, serializer.validated_data['ids'])
+        return Response({'results': [
+            {'id': recipe_id, 'status': result}
+            for recipe_id, result in results.items()
+        ]})
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='favorite/batch',
+            permission_classes=[IsAuthenticated])
+    def favorite_batch(self, request):
+        return self.manage_recipe_batch(Favorite, request)
 
-            shopping_list_content = generate_shopping_list(
-                user, ingredients, recipes)
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart/batch',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        return self.manage_recipe_batch(ShoppingCart, request)
 
-            return FileResponse(
-                shopping_list_content,
-                as_attachment=True,
-                filename='shopping_list.txt',
-                content_type='text/plain'
-            )
-        except Exception as e:
-            return Response(
-                {'error': 'Ошибка при создании списка покупок'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS,
+            content_negotiation_class=ShoppingListNegotiation)
+    def download_shopping_cart(self, request):
+        """Скачивание списка покупок в формате из ?format= (txt, csv, pdf)."""
+        user = request.user
+        ingredients = (
+            ShoppingCartTotal.objects
+            .filter(user=user)
+            .values('ingredient__name', 'ingredient__measurement_unit',
+                    'total_amount')
+            .order_by('ingredient__name')
+        )
+        recipes = (
+            Recipe.objects
+            .filter(shopping_carts__user=user)
+            .select_related('author')
+            .only('name', 'author__username')
+        )
+
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(user, ingredients.iterator(), recipes.iterator()),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
+        )
+        return response
 
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_link(self, request, pk=None):
@@ -278,20 +528,28 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet для работы с ингредиентами."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (DjangoFilterBackend,)
-    search_fields = ('^name',)
 
-    def get_queryset(self):
-        try:
-            queryset = Ingredient.objects.all().order_by('name')
-            name = self.request.query_params.get('name', None)
-            if name:
-                queryset = queryset.filter(name__icontains=name)
-            return queryset
-        except Exception as e:
-            return Ingredient.objects.none()
+    def get_etag_versions(self):
+        return (get_version(INGREDIENTS_VERSION),)
+
+    def search(self, request, *args, **kwargs):
+        """Список ингредиентов из индекса в памяти процесса.
+
+        Сначала идут ингредиенты, начинающиеся с name, затем содержащие его.
+        """
+        index = get_ingredient_index()
+        name = request.query_params.get('name')
+        return Response(index.search(name) if name else index.items)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, self.search, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().retrieve, *args, **kwargs)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -57,6 +58,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -88,6 +90,12 @@ if DEBUG:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Параллельные транзакции ждут блокировку на запись, а не
+            # падают с "database is locked"
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+            # Файл, а не база в памяти: тестам с потоками нужны
+            # независимые соединения
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 else:
@@ -102,6 +110,55 @@ else:
         }
     }
 
+# Реплики только для чтения (core.db_router): через запятую хосты
+# PostgreSQL, а при DEBUG - файлы SQLite относительно BASE_DIR
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    if DEBUG:
+        DATABASES[alias]['NAME'] = BASE_DIR / replica.strip()
+    else:
+        DATABASES[alias]['HOST'] = replica.strip()
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+# Сколько секунд после записи клиент читает с основной базы
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', 5))
+
+# Cache
+# Версии данных (core.versions), по которым сбрасываются индексы в памяти,
+# ETag, кеш ответов и кеш токенов, хранятся здесь, поэтому кеш должен быть
+# общим для всех процессов: воркеров gunicorn, воркера очереди задач и
+# команд управления. По умолчанию это файлы во временном каталоге, что
+# подходит для одного хоста; в docker-compose используется Redis:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://redis:6379/0
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+    }
+}
+
+# Тесты получают свой кеш, см. core.test_runner
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Время жизни кешированных ответов для анонимных пользователей, секунды
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -148,9 +205,40 @@ AUTH_USER_MODEL = 'core.User'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Ограничения на загружаемые изображения рецептов и аватаров
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 5 * 1024 * 1024))
+IMAGE_UPLOAD_MAX_PIXELS = int(
+    os.getenv('IMAGE_UPLOAD_MAX_PIXELS', 40_000_000))
+# Файлы больше этого размера пишутся на диск частями, а не в память
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+
+# Очередь фоновых задач (core.jobs, manage.py run_worker):
+# время захвата задачи воркером, число попыток и задержка перед повтором
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', 600))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+JOB_RETRY_DELAY = int(os.getenv('JOB_RETRY_DELAY', 30))
+
+# Лента подписок (core.feed): сколько рецептов хранится в ленте
+# пользователя и начиная с какого числа подписчиков рецепты автора
+# подмешиваются при чтении, а не раскладываются по лентам
+FEED_MAX_ENTRIES = int(os.getenv('FEED_MAX_ENTRIES', 500))
+FEED_FANOUT_MAX_SUBSCRIBERS = int(
+    os.getenv('FEED_FANOUT_MAX_SUBSCRIBERS', 1000))
+
+# Асинхронное чтение рецептов и ингредиентов (api.async_views),
+# включается при запуске под ASGI
+ASYNC_READ_VIEWS = (
+    os.getenv('ASYNC_READ_VIEWS', 'false').lower() == 'true')
+
+# Кеш аутентификации по токену (api.authentication): сколько токенов
+# хранится в памяти процесса и сколько секунд действует запись
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 60))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -174,6 +262,11 @@ DJOSER = {
     }
 }
 
+# Шрифт с кириллицей для списка покупок в PDF
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
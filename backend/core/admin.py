@@ -3,6 +3,7 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.safestring import mark_safe
 from .models import (
     Ingredient,
+    Job,
     Recipe,
     RecipeIngredient,
     Favorite,
@@ -37,17 +38,20 @@ class UserAdmin(BaseUserAdmin):
             'height="50" style="border-radius: 50%;" />'
         )
 
-    @admin.display(description="Количество рецептов")
+    @admin.display(description="Количество рецептов",
+                   ordering='recipes_count')
     def get_recipes_count(self, user):
-        return user.recipes.count()
+        return user.recipes_count
 
-    @admin.display(description="Число подписок")
+    @admin.display(description="Число подписок",
+                   ordering='subscriptions_count')
     def get_subscriptions_count(self, user):
-        return user.followers.count()
+        return user.subscriptions_count
 
-    @admin.display(description="Число подписчиков")
+    @admin.display(description="Число подписчиков",
+                   ordering='subscribers_count')
     def get_subscribers_count(self, user):
-        return user.authors.count()
+        return user.subscribers_count
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -68,9 +72,10 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = ('name', 'author__username')
     inlines = [RecipeIngredientInline]
 
-    @admin.display(description="Добавлено в избранное")
+    @admin.display(description="Добавлено в избранное",
+                   ordering='favorites_count')
     def get_favorites_count(self, recipe):
-        return recipe.favorites.count()
+        return recipe.favorites_count
 
     @admin.display(description="Список ингредиентов")
     @mark_safe
@@ -113,3 +118,10 @@ class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
     list_filter = ('user', 'author')
     search_fields = ('user__username', 'author__username')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_after', 'created_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('attempts', 'locked_until', 'last_error', 'created_at')
@@ -0,0 +1,36 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from core.versions import versions_are_shared
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Версии данных требуют общего для всех процессов кеша."""
+    if versions_are_shared():
+        return []
+    return [Warning(
+        'Кеш по умолчанию хранится в памяти процесса.',
+        hint=('Изменения, сделанные другими процессами (load_data, '
+              'воркер, другие воркеры gunicorn), не сбросят индексы '
+              'ингредиентов и рецептов, ETag и кеш токенов. Задайте '
+              'общий CACHE_BACKEND: Redis или FileBasedCache.'),
+        id='core.W001',
+    )]
+
+
+@register()
+def check_shopping_list_font(app_configs, **kwargs):
+    """Без шрифта с кириллицей не соберется PDF со списком покупок."""
+    if os.path.isfile(settings.SHOPPING_LIST_PDF_FONT):
+        return []
+    return [Error(
+        'Не найден шрифт для списка покупок в PDF: '
+        f'{settings.SHOPPING_LIST_PDF_FONT}.',
+        hint=('Установите шрифт с кириллицей (в Debian - пакет '
+              'fonts-dejavu-core) или укажите путь к файлу TTF '
+              'в SHOPPING_LIST_PDF_FONT.'),
+        id='core.E001',
+    )]
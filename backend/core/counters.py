@@ -0,0 +1,64 @@
+"""Денормализованные счетчики пользователей и рецептов.
+
+Счетчики меняются F-выражениями при создании и удалении рецептов,
+избранного и подписок (см. core.signals). reconcile_counters()
+исправляет расхождения, если строки менялись в обход сигналов; ее можно
+запустить и фоновой задачей (manage.py reconcile_counters --background).
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from core.jobs import register_job
+from core.models import Favorite, Recipe, Subscription, User
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счетчик field у объекта model с первичным ключом pk.
+
+    Счетчик не опускается ниже нуля.
+    """
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """Как change_counter, но одним запросом для нескольких объектов."""
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def _count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscriptions_count', Subscription, 'user'),
+    (User, 'subscribers_count', Subscription, 'author'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+)
+
+
+@register_job('reconcile_counters')
+def reconcile_counters():
+    """Пересчитывает разошедшиеся счетчики, возвращает {поле: исправлено}."""
+    fixed = {}
+    for model, counter, source, field in COUNTERS:
+        actual = f'actual_{counter}'
+        drifted = model.objects.annotate(**{actual: _count(source, field)})
+        drifted = drifted.filter(~Q(**{counter: F(actual)}))
+        fixed[counter] = model.objects.filter(
+            pk__in=drifted.values('pk')
+        ).update(**{counter: _count(source, field)})
+    return fixed
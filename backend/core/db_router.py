@@ -0,0 +1,59 @@
+"""Распределение запросов между основной базой и репликами.
+
+Реплики перечислены в settings.DATABASE_REPLICAS. Чтения уходят на
+случайную реплику только внутри use_replicas(): его включает
+api.middleware.ReplicaMiddleware для безопасных запросов к API. Запись,
+фоновые задачи и команды управления работают с основной базой.
+
+Данные, которые хранятся дольше запроса (кеш ответов, индексы в памяти),
+и ответы с ETag строятся по основной базе (use_primary()): иначе отставшая
+реплика закрепила бы устаревшие данные под новой версией, а клиент
+получал бы на них 304 до следующей записи.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Токены читаются с основной базы, чтобы полученный при входе токен
+# работал сразу, а не после того, как до него дойдет реплика
+PRIMARY_ONLY_MODELS = {'authtoken.token'}
+
+_read_from_replicas = ContextVar('read_from_replicas', default=False)
+
+
+@contextmanager
+def use_replicas(enabled=True):
+    """Направляет чтения внутри блока на реплики, если они настроены."""
+    token = _read_from_replicas.set(
+        enabled and bool(settings.DATABASE_REPLICAS))
+    try:
+        yield
+    finally:
+        _read_from_replicas.reset(token)
+
+
+def use_primary():
+    """Направляет чтения внутри блока на основную базу."""
+    return use_replicas(False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (_read_from_replicas.get()
+                and model._meta.label_lower not in PRIMARY_ONLY_MODELS):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема попадает на реплики вместе с репликацией
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,99 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Лента собирается при записи: опубликованный рецепт фоновая задача
+fan_out_recipe добавляет в FeedEntry каждого подписчика автора, после
+чего ленты обрезаются до FEED_MAX_ENTRIES последних рецептов. Рецепты
+авторов, у которых подписчиков больше FEED_FANOUT_MAX_SUBSCRIBERS, по
+лентам не раскладываются, а подмешиваются при чтении.
+
+При подписке в ленту добавляются последние рецепты автора, при отписке
+они из нее удаляются.
+"""
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from core.jobs import register_job
+from core.models import FeedEntry, Recipe, Subscription, User
+
+
+def feed_recipes(user, queryset=None):
+    """Рецепты ленты пользователя, без сортировки."""
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    return queryset.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('recipe'))
+        | Q(author__in=Subscription.objects.filter(
+            user=user,
+            author__subscribers_count__gt=(
+                settings.FEED_FANOUT_MAX_SUBSCRIBERS),
+        ).values('author'))
+    )
+
+
+def trim_feeds(user_ids):
+    """Удаляет из лент user_ids записи старше FEED_MAX_ENTRIES последних."""
+    extra = list(
+        FeedEntry.objects.filter(user__in=user_ids).annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('user'),
+                order_by=(F('recipe__date_published').desc(),
+                          F('recipe').desc()),
+            ),
+        ).filter(position__gt=settings.FEED_MAX_ENTRIES)
+        .values_list('pk', flat=True)
+    )
+    if extra:
+        FeedEntry.objects.filter(pk__in=extra).delete()
+
+
+def _fans_out(author_id):
+    return User.objects.filter(
+        pk=author_id,
+        subscribers_count__lte=settings.FEED_FANOUT_MAX_SUBSCRIBERS,
+    ).exists()
+
+
+@register_job('fan_out_recipe')
+def fan_out_recipe(recipe_id):
+    """Добавляет рецепт в ленты подписчиков автора."""
+    author_id = (
+        Recipe.objects.filter(pk=recipe_id)
+        .values_list('author_id', flat=True).first()
+    )
+    if author_id is None or not _fans_out(author_id):
+        return
+    followers = list(
+        Subscription.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+    )
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user_id, recipe_id=recipe_id)
+         for user_id in followers],
+        ignore_conflicts=True,
+    )
+    trim_feeds(followers)
+
+
+def add_author_to_feed(user_id, author_id):
+    """Добавляет в ленту пользователя последние рецепты автора."""
+    if not _fans_out(author_id):
+        return
+    recipes = (
+        Recipe.objects.filter(author_id=author_id)
+        .order_by('-date_published', '-id')
+        .values_list('pk', flat=True)[:settings.FEED_MAX_ENTRIES]
+    )
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user_id, recipe_id=recipe_id)
+         for recipe_id in recipes],
+        ignore_conflicts=True,
+    )
+    trim_feeds([user_id])
+
+
+def remove_author_from_feed(user_id, author_id):
+    """Удаляет из ленты пользователя рецепты автора."""
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id).delete()
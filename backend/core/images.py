@@ -0,0 +1,91 @@
+"""Уменьшенные копии изображений рецептов в форматах WebP и JPEG.
+
+Копии строит фоновая задача (см. core.jobs), поэтому запрос на создание
+рецепта не ждет обработки изображения. Результат
+записывается в Recipe.image_variants вместе с именем исходного файла.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from core.jobs import enqueue, register_job
+from core.models import Recipe
+from core.versions import bump_recipe_versions
+
+# Размер: максимальные ширина и высота
+IMAGE_VARIANTS = {
+    'card': (480, 360),
+    'detail': (960, 720),
+    'retina': (1920, 1440),
+}
+# Формат: расширение, имя формата Pillow и параметры сохранения
+IMAGE_FORMATS = {
+    'webp': ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 85, 'optimize': True,
+                             'progressive': True}),
+}
+VARIANTS_DIR = 'recipes/images/variants'
+
+
+def build_variants(source):
+    """Строит копии файла source и сохраняет их в хранилище.
+
+    Возвращает {размер: {формат: путь}}.
+    """
+    stem = os.path.splitext(os.path.basename(source))[0]
+    with default_storage.open(source) as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.mode else 'RGB')
+
+    variants = {}
+    for variant, size in IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        variants[variant] = {}
+        for image_format, (extension, pil_format, options) in (
+                IMAGE_FORMATS.items()):
+            converted = image
+            if pil_format == 'JPEG' and image.mode != 'RGB':
+                converted = image.convert('RGB')
+            buffer = BytesIO()
+            converted.save(buffer, pil_format, **options)
+            path = f'{VARIANTS_DIR}/{stem}_{variant}.{extension}'
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            variants[variant][image_format] = default_storage.save(
+                path, ContentFile(buffer.getvalue()))
+    return variants
+
+
+@register_job('generate_image_variants')
+def generate_image_variants(recipe_id):
+    """Строит копии изображения рецепта и сохраняет их пути в рецепт."""
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    variants = build_variants(source)
+    # Если изображение успели заменить, результат отбрасывается
+    updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_variants={'source': source, 'variants': variants})
+    if updated:
+        bump_recipe_versions([recipe_id])
+
+
+def schedule_image_variants(recipe, previous_image=None):
+    """Ставит построение копий в очередь, если изображение сменилось.
+
+    previous_image - имя файла изображения до сохранения рецепта.
+    """
+    if (not recipe.image
+            or recipe.image.name == previous_image
+            or recipe.image_variants.get('source') == recipe.image.name):
+        return
+    # Задача берет текущее изображение рецепта, поэтому одной ждущей
+    # задачи на рецепт достаточно
+    enqueue('generate_image_variants', unique=True, recipe_id=recipe.pk)
@@ -0,0 +1,155 @@
+"""Потоковый импорт каталога ингредиентов из CSV, JSON и NDJSON.
+
+Файл читается по частям, а записи сохраняются пачками фиксированного
+размера, поэтому память не зависит от размера каталога. Повторный импорт
+не создает дублей: уже существующие записи отсеиваются одним запросом на
+пачку, а уникальность пары (name, measurement_unit) гарантирует база.
+"""
+import csv
+import json
+import os
+from itertools import islice
+
+from core.ingredient_index import invalidate_ingredient_index
+from core.models import Ingredient
+
+FORMATS = ('csv', 'json', 'ndjson')
+EXTENSIONS = {'.csv': 'csv', '.json': 'json', '.ndjson': 'ndjson',
+              '.jsonl': 'ndjson'}
+DEFAULT_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
+
+_name_length = Ingredient._meta.get_field('name').max_length
+_unit_length = Ingredient._meta.get_field('measurement_unit').max_length
+
+
+def detect_format(path):
+    """Определяет формат файла по расширению."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError(f'Неизвестный формат файла {path}')
+    return EXTENSIONS[extension]
+
+
+def iter_csv(file):
+    """Строки CSV без заголовка: название, единица измерения."""
+    for row in csv.reader(file):
+        if row:
+            yield {'name': row[0],
+                   'measurement_unit': row[1] if len(row) > 1 else ''}
+
+
+def iter_ndjson(file):
+    """По одному JSON-объекту на строку."""
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_json(file):
+    """Элементы JSON-массива верхнего уровня, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            # Пропускаем пробелы и разделители между элементами
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise json.JSONDecodeError(
+                        'Ожидался массив', buffer, position)
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                # Элемент не поместился в прочитанную часть, дочитываем
+                break
+            if end == len(buffer) and chunk:
+                # Число на границе части могло быть прочитано не целиком
+                break
+            position = end
+            yield item
+        if not chunk:
+            raise json.JSONDecodeError(
+                'Неожиданный конец файла', buffer, position)
+
+
+READERS = {'csv': iter_csv, 'json': iter_json, 'ndjson': iter_ndjson}
+
+
+def clean_row(row):
+    """Нормализует запись, для некорректной возвращает None."""
+    if not isinstance(row, dict):
+        return None
+    name = str(row.get('name') or '').strip()
+    unit = str(row.get('measurement_unit') or '').strip()
+    if (not name or not unit or len(name) > _name_length
+            or len(unit) > _unit_length):
+        return None
+    return name, unit
+
+
+def import_ingredients(rows, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Сохраняет записи rows пачками по batch_size.
+
+    progress(прочитано, добавлено) вызывается после каждой пачки.
+    Возвращает (прочитано, добавлено, пропущено некорректных).
+    """
+    rows = iter(rows)
+    read = created = invalid = 0
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            read += len(batch)
+            keys = set()
+            for row in batch:
+                key = clean_row(row)
+                if key is None:
+                    invalid += 1
+                else:
+                    keys.add(key)
+            existing = set(
+                Ingredient.objects
+                .filter(name__in={name for name, _ in keys})
+                .values_list('name', 'measurement_unit')
+            )
+            new = keys - existing
+            # ignore_conflicts на случай параллельного импорта тех же записей
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in new],
+                ignore_conflicts=True,
+            )
+            created += len(new)
+            if progress is not None:
+                progress(read, created)
+    finally:
+        # bulk_create не отправляет сигналы, сбрасываем индекс явно. Пачки
+        # сохраняются по отдельности, и добавленные до ошибки тоже должны
+        # попасть в индекс
+        if created:
+            invalidate_ingredient_index()
+    return read, created, invalid
+
+
+def import_file(path, file_format=None, **kwargs):
+    """Импортирует ингредиенты из файла path (см. import_ingredients)."""
+    file_format = file_format or detect_format(path)
+    with open(path, encoding='utf-8', newline='') as file:
+        return import_ingredients(READERS[file_format](file), **kwargs)
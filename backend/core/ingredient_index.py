@@ -0,0 +1,81 @@
+"""Индекс ингредиентов в памяти процесса для поиска по названию."""
+from bisect import bisect_left, bisect_right
+from threading import Lock
+
+from django.db import transaction
+
+from core.db_router import use_primary
+from core.models import Ingredient
+from core.versions import INGREDIENTS_VERSION, bump_version, get_version
+
+
+class IngredientIndex:
+    """Отсортированный по названию каталог ингредиентов.
+
+    Поиск сначала возвращает ингредиенты, название которых начинается
+    с запроса (двоичный поиск по отсортированным ключам), затем те,
+    в названии которых запрос встречается в середине.
+    """
+
+    def __init__(self, ingredients):
+        pairs = sorted(
+            ((item['name'].lower(), item) for item in ingredients),
+            key=lambda pair: pair[0]
+        )
+        self.keys = [key for key, _ in pairs]
+        self.items = [item for _, item in pairs]
+        # Все ключи одной строкой: подстроку ищет str.find на стороне C
+        self.text = '\n'.join(self.keys)
+        self.offsets = []
+        offset = 0
+        for key in self.keys:
+            self.offsets.append(offset)
+            offset += len(key) + 1
+
+    def search(self, query):
+        query = query.lower()
+        start = bisect_left(self.keys, query)
+        end = bisect_left(self.keys, query + '\U0010ffff', lo=start)
+        if not query or '\n' in query:
+            return self.items[start:end]
+        substring = []
+        position = self.text.find(query)
+        while position != -1:
+            number = bisect_right(self.offsets, position) - 1
+            if position != self.offsets[number]:
+                substring.append(self.items[number])
+            # Переходим к следующему ключу, чтобы не дублировать совпадения
+            next_key = number + 1
+            if next_key == len(self.offsets):
+                break
+            position = self.text.find(query, self.offsets[next_key])
+        return self.items[start:end] + substring
+
+
+_index = None
+_index_version = None
+_lock = Lock()
+
+
+def get_ingredient_index():
+    """Возвращает индекс, перестраивая его при изменении ингредиентов."""
+    global _index, _index_version
+    version = get_version(INGREDIENTS_VERSION)
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                # Индекс живет до смены версии, реплика могла отстать
+                with use_primary():
+                    _index = IngredientIndex(Ingredient.objects.values(
+                        'id', 'name', 'measurement_unit'))
+                _index_version = version
+    return _index
+
+
+def invalidate_ingredient_index():
+    """Помечает индекс устаревшим во всех процессах с общим кешем.
+
+    Версия меняется после коммита текущей транзакции, иначе другой
+    процесс успел бы построить индекс по незакоммиченным данным.
+    """
+    transaction.on_commit(lambda: bump_version(INGREDIENTS_VERSION))
@@ -0,0 +1,133 @@
+"""Очередь фоновых задач в базе данных, без внешнего брокера.
+
+Задача регистрируется декоратором register_job и ставится в очередь
+через enqueue() в той же транзакции, что и данные, к которым она
+относится. Выполняет задачи команда manage.py run_worker.
+
+Воркер захватывает задачу условным UPDATE: строку получает тот, чей
+UPDATE изменил ее первым. Захват действует JOB_LOCK_TIMEOUT секунд;
+если воркер упал, после этого задачу заберет другой воркер. При ошибке
+задача повторяется с экспоненциальной задержкой, пока не кончатся
+попытки.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Сколько кандидатов читается за раз при захвате задачи
+CLAIM_BATCH = 10
+
+_registry = {}
+
+
+def register_job(name):
+    """Регистрирует функцию как обработчик задачи name."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, delay=0, max_attempts=None, unique=False, **payload):
+    """Ставит задачу в очередь, параметры передаются обработчику.
+
+    С unique=True задача не создается, если такая же уже ждет в очереди.
+    """
+    if name not in _registry:
+        raise LookupError(f'Неизвестная задача: {name}')
+    if unique:
+        queued = Job.objects.filter(
+            name=name, payload=payload, status=Job.QUEUED).first()
+        if queued is not None:
+            return queued
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        run_after=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def _available(now):
+    return Q(run_after__lte=now) & (
+        Q(status=Job.QUEUED)
+        | Q(status=Job.RUNNING, locked_until__lt=now)
+    )
+
+
+def claim_job():
+    """Захватывает первую готовую задачу или возвращает None."""
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(_available(now))
+        .values_list('pk', flat=True)[:CLAIM_BATCH]
+    )
+    locked_until = now + timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    for pk in candidates:
+        claimed = Job.objects.filter(_available(now), pk=pk).update(
+            status=Job.RUNNING,
+            locked_until=locked_until,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    """Выполняет захваченную задачу. Возвращает True при успехе."""
+    # Результат записывается, только если задачу не перехватил
+    # другой воркер по истечении захвата
+    owned = Job.objects.filter(pk=job.pk, locked_until=job.locked_until)
+    if job.attempts > job.max_attempts:
+        # Воркеры падали на задаче, не успевая записать результат
+        owned.update(status=Job.FAILED, locked_until=None,
+                     last_error=job.last_error or 'Истекло время захвата')
+        return False
+    try:
+        handler = _registry.get(job.name)
+        if handler is None:
+            raise LookupError(f'Неизвестная задача: {job.name}')
+        handler(**job.payload)
+    except Exception:
+        logger.exception('Задача %s завершилась с ошибкой', job)
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            owned.update(status=Job.FAILED, locked_until=None,
+                         last_error=traceback.format_exc())
+        else:
+            delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            owned.update(status=Job.QUEUED, locked_until=None,
+                         run_after=now + timedelta(seconds=delay),
+                         last_error=traceback.format_exc())
+        return False
+    owned.delete()
+    return True
+
+
+def work(stop, poll_interval, burst=False):
+    """Цикл воркера: выполняет задачи, пока не установлен stop.
+
+    В режиме burst выходит, когда в очереди не осталось готовых задач.
+    """
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            job = claim_job()
+            if job is None:
+                if burst:
+                    break
+                stop.wait(poll_interval)
+                continue
+            run_job(job)
+    finally:
+        connections.close_all()
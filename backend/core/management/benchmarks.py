@@ -0,0 +1,22 @@
+"""Общее для команд замеров."""
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+class Rollback(Exception):
+    """Отменяет транзакцию замера."""
+
+
+@contextmanager
+def rolled_back():
+    """Выполняет блок в транзакции и отменяет ее.
+
+    Замеры создают данные, которые не должны оставаться в базе.
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from statistics import quantiles
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Ingredient, Recipe
+
+HOST = '127.0.0.1'
+SERVERS = (
+    ('WSGI, gunicorn sync', 'backend.wsgi:application', {}),
+    ('ASGI, uvicorn', 'backend.asgi:application',
+     {'ASYNC_READ_VIEWS': 'true'}),
+)
+
+
+def server_command(application, port):
+    if application.endswith('.asgi:application'):
+        return [sys.executable, '-m', 'uvicorn', application,
+                '--host', HOST, '--port', str(port), '--workers', '1',
+                '--no-access-log', '--log-level', 'warning']
+    return [sys.executable, '-m', 'gunicorn', application,
+            '--bind', f'{HOST}:{port}', '--workers', '1',
+            '--log-level', 'warning']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'Сервер на порту {port} не запустился.')
+
+
+async def get(port, path, trickle=0):
+    """GET-запрос; при trickle > 0 клиент передает заголовки по байту."""
+    reader, writer = await asyncio.open_connection(HOST, port)
+    request = (f'GET {path} HTTP/1.1\r\nHost: {HOST}\r\n'
+               'Accept: application/json\r\nConnection: close\r\n\r\n'
+               ).encode()
+    try:
+        if trickle:
+            for i in range(len(request)):
+                writer.write(request[i:i + 1])
+                await writer.drain()
+                await asyncio.sleep(trickle)
+        else:
+            writer.write(request)
+            await writer.drain()
+        status = (await reader.readline()).split()[1]
+        await reader.read()
+    finally:
+        writer.close()
+    if status != b'200':
+        raise CommandError(f'{path}: ответ {status.decode()}')
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает чтение рецептов и ингредиентов под синхронным "
+            "WSGI (gunicorn) и асинхронным ASGI (uvicorn) при медленных "
+            "клиентах; оба сервера запускаются с одним процессом")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Число обычных запросов')
+        parser.add_argument('--concurrency', type=int, default=20,
+                            help='Одновременных обычных клиентов')
+        parser.add_argument('--slow-clients', type=int, default=10,
+                            help='Клиентов, медленно передающих запрос')
+        parser.add_argument('--slow-delay', type=float, default=0.01,
+                            help='Пауза между байтами медленного клиента')
+
+    def handle(self, *args, **options):
+        paths = self.get_paths()
+        self.stdout.write(
+            f"{'сервер':<22}{'запросов/с':>12}{'p50, мс':>10}"
+            f"{'p95, мс':>10}{'медленных/с':>13}")
+        for name, application, env in SERVERS:
+            port = free_port()
+            process = subprocess.Popen(
+                server_command(application, port),
+                cwd=settings.BASE_DIR, env={**os.environ, **env})
+            try:
+                wait_for_port(port)
+                rate, p50, p95, slow_rate = asyncio.run(
+                    self.run(port, paths, options))
+            finally:
+                process.terminate()
+                process.wait()
+            self.stdout.write(f"{name:<22}{rate:>12.0f}{p50:>10.1f}"
+                              f"{p95:>10.1f}{slow_rate:>13.1f}")
+
+    def get_paths(self):
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True)[:1000])
+        names = list(Ingredient.objects.values_list('name', flat=True)[:100])
+        if not recipe_ids or not names:
+            raise CommandError('Нужны рецепты и ингредиенты в базе.')
+        pages = max(1, min(len(recipe_ids) // 6, 50))
+        return (
+            [f'/api/recipes/?page={page}' for page in range(1, pages + 1)]
+            + [f'/api/recipes/{pk}/' for pk in recipe_ids[:100]]
+            + [f'/api/ingredients/?name={quote(name[:3])}' for name in names]
+            + [f'/api/ingredients/{pk}/' for pk in
+               Ingredient.objects.values_list('id', flat=True)[:100]]
+        )
+
+    async def run(self, port, paths, options):
+        # Прогрев: кеш ответов, индекс ингредиентов, соединения с базой
+        for path in paths:
+            await get(port, path)
+        slow_done = 0
+        stop = asyncio.Event()
+
+        async def slow_client():
+            nonlocal slow_done
+            while not stop.is_set():
+                await get(port, random.choice(paths), options['slow_delay'])
+                slow_done += 1
+
+        queue = asyncio.Queue()
+        for _ in range(options['requests']):
+            queue.put_nowait(random.choice(paths))
+        latencies = []
+
+        async def client():
+            while not queue.empty():
+                path = queue.get_nowait()
+                start = time.perf_counter()
+                await get(port, path)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        slow = [asyncio.create_task(slow_client())
+                for _ in range(options['slow_clients'])]
+        start = time.perf_counter()
+        await asyncio.gather(*(client()
+                               for _ in range(options['concurrency'])))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*slow)
+        percentiles = quantiles(latencies, n=20)
+        return (len(latencies) / elapsed, percentiles[9], percentiles[18],
+                slow_done / elapsed)
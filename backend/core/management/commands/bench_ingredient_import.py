@@ -0,0 +1,95 @@
+import csv
+import json
+import os
+import tempfile
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from core.ingredient_import import DEFAULT_BATCH_SIZE, import_file
+from core.management.benchmarks import rolled_back
+from core.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ("Замеряет импорт ингредиентов на каталоге, увеличенном "
+            "в --multiplier раз, во всех форматах")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--multiplier', type=int, default=100)
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            '--source', default=os.path.join('data', 'ingredients.json'))
+
+    def write_catalogue(self, directory, multiplier, source):
+        with open(source, encoding='utf-8') as file:
+            base = json.load(file)
+        items = [
+            {'name': f"{item['name']} {copy}",
+             'measurement_unit': item['measurement_unit']}
+            for copy in range(multiplier) for item in base
+        ]
+        paths = {}
+        paths['json'] = os.path.join(directory, 'ingredients.json')
+        with open(paths['json'], 'w', encoding='utf-8') as file:
+            json.dump(items, file, ensure_ascii=False)
+        paths['ndjson'] = os.path.join(directory, 'ingredients.ndjson')
+        with open(paths['ndjson'], 'w', encoding='utf-8') as file:
+            for item in items:
+                file.write(json.dumps(item, ensure_ascii=False) + '\n')
+        paths['csv'] = os.path.join(directory, 'ingredients.csv')
+        with open(paths['csv'], 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            for item in items:
+                writer.writerow((item['name'], item['measurement_unit']))
+        return len(items), paths
+
+    def measure(self, func):
+        """Время выполнения func в транзакции, которая затем отменяется."""
+        result = None
+        start = perf_counter()
+        with rolled_back():
+            result = func()
+            elapsed = perf_counter() - start
+        return elapsed, result
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with tempfile.TemporaryDirectory() as directory:
+            total, paths = self.write_catalogue(
+                directory, options['multiplier'], options['source'])
+            self.stdout.write(
+                f"Записей в каталоге: {total}, пачка: {batch_size}")
+            self.stdout.write(f"{'формат':<10}{'добавлено':>11}"
+                              f"{'повтор, c':>12}{'время, c':>11}"
+                              f"{'записей/с':>12}")
+            for file_format, path in paths.items():
+                def import_twice():
+                    first = import_file(path, batch_size=batch_size)
+                    start = perf_counter()
+                    import_file(path, batch_size=batch_size)
+                    return first, perf_counter() - start
+
+                elapsed, ((read, created, _), repeat) = self.measure(
+                    import_twice)
+                elapsed -= repeat
+                self.stdout.write(
+                    f"{file_format:<10}{created:>11}{repeat:>12.2f}"
+                    f"{elapsed:>11.2f}{read / elapsed:>12.0f}"
+                )
+
+            def load_whole():
+                # Прежний способ: весь файл и все объекты в памяти
+                with open(paths['json'], encoding='utf-8') as file:
+                    data = json.load(file)
+                Ingredient.objects.bulk_create(
+                    [Ingredient(**item) for item in data],
+                    ignore_conflicts=True,
+                )
+
+            elapsed, _ = self.measure(load_whole)
+            self.stdout.write(
+                f"{'json.load':<10}{'-':>11}{'-':>12}"
+                f"{elapsed:>11.2f}{total / elapsed:>12.0f}"
+            )
@@ -0,0 +1,36 @@
+from timeit import timeit
+
+from django.core.management.base import BaseCommand
+
+from core.ingredient_index import IngredientIndex
+from core.models import Ingredient
+
+DEFAULT_QUERIES = ('а', 'мо', 'сыр', 'кур', 'лук', 'масло', 'перец', 'соль')
+
+
+class Command(BaseCommand):
+    help = "Сравнивает поиск ингредиентов через SQL и через индекс в памяти"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('queries', nargs='*', default=DEFAULT_QUERIES)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        fields = ('id', 'name', 'measurement_unit')
+        index = IngredientIndex(Ingredient.objects.values(*fields))
+        self.stdout.write(f"Ингредиентов в каталоге: {len(index.items)}")
+        self.stdout.write(f"{'запрос':<10}{'найдено':>9}{'SQL, мкс':>12}"
+                          f"{'индекс, мкс':>14}")
+        for query in options['queries']:
+            sql_time = timeit(
+                lambda: list(Ingredient.objects.filter(
+                    name__icontains=query).values(*fields)),
+                number=repeat
+            )
+            index_time = timeit(lambda: index.search(query), number=repeat)
+            self.stdout.write(
+                f"{query:<10}{len(index.search(query)):>9}"
+                f"{sql_time / repeat * 1e6:>12.1f}"
+                f"{index_time / repeat * 1e6:>14.1f}"
+            )
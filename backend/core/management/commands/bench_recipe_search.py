@@ -0,0 +1,82 @@
+import json
+import os
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.management.benchmarks import rolled_back
+from core.models import Recipe, User
+from core.search import search_recipes, search_terms
+
+DEFAULT_QUERIES = ('борщ', 'курица', 'сыр моцарелла', 'томатн', 'шоколад')
+DISHES = ('борщ', 'суп', 'салат', 'пирог', 'запеканка', 'рагу', 'омлет',
+          'паста', 'плов', 'котлеты', 'блины', 'пицца', 'десерт', 'соус')
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = ("Замеряет полнотекстовый поиск рецептов и поиск через "
+            "icontains на --recipes синтетических рецептах")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('queries', nargs='*', default=DEFAULT_QUERIES)
+
+    def create_recipes(self, count, batch_size):
+        path = os.path.join('data', 'ingredients.json')
+        with open(path, encoding='utf-8') as file:
+            words = [item['name'] for item in json.load(file)]
+        words.extend(DISHES)
+        author = User.objects.create_user(
+            username='bench_search', email='bench_search@example.com')
+        rng = random.Random(0)
+        for start in range(0, count, batch_size):
+            Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name=f'{rng.choice(DISHES)} {rng.choice(words)}',
+                    text='. '.join(rng.sample(words, 12)),
+                    cooking_time=rng.randint(5, 180),
+                    image='recipes/images/bench.png',
+                )
+                for _ in range(start, min(start + batch_size, count))
+            )
+
+    def timed(self, queryset, repeat):
+        """Среднее время первой страницы и числа результатов, в мс."""
+        start = perf_counter()
+        for _ in range(repeat):
+            list(queryset[:PAGE_SIZE])
+            count = queryset.count()
+        return (perf_counter() - start) / repeat * 1000, count
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.run(options)
+
+    def run(self, options):
+        start = perf_counter()
+        self.create_recipes(options['recipes'], options['batch_size'])
+        self.stdout.write(
+            f"Создано рецептов: {options['recipes']} "
+            f"за {perf_counter() - start:.1f} с"
+        )
+        self.stdout.write(f"{'запрос':<16}{'найдено':>9}{'поиск, мс':>11}"
+                          f"{'icontains, мс':>15}")
+        recipes = Recipe.objects.all()
+        for query in options['queries']:
+            ranked = search_recipes(recipes, query).order_by(
+                '-search_rank', '-date_published', '-id')
+            search_time, found = self.timed(ranked, options['repeat'])
+            naive = recipes
+            for term in search_terms(query):
+                naive = naive.filter(
+                    Q(name__icontains=term) | Q(text__icontains=term))
+            naive_time, _ = self.timed(
+                naive.order_by('-date_published', '-id'), options['repeat'])
+            self.stdout.write(f"{query:<16}{found:>9}{search_time:>11.1f}"
+                              f"{naive_time:>15.1f}")
@@ -0,0 +1,59 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from api.authentication import CachedTokenAuthentication, clear_token_cache
+from api.views import CustomUserViewSet
+from core.management.benchmarks import rolled_back
+from core.models import User
+
+AUTHENTICATION_CLASSES = (TokenAuthentication, CachedTokenAuthentication)
+
+
+class Command(BaseCommand):
+    help = ("Замеряет число запросов в секунду к /api/users/me/ "
+            "с TokenAuthentication и CachedTokenAuthentication")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.run(options['requests'])
+
+    def run(self, count):
+        user = User.objects.create_user(
+            username='bench_auth', email='bench_auth@example.com')
+        token = Token.objects.create(user=user)
+        factory = APIRequestFactory(SERVER_NAME=settings.ALLOWED_HOSTS[0])
+        self.stdout.write(f"{'аутентификация':<28}{'запросов/с':>12}"
+                          f"{'SQL на запрос':>15}")
+        for authentication_class in AUTHENTICATION_CLASSES:
+            view = CustomUserViewSet.as_view(
+                {'get': 'me'}, authentication_classes=[authentication_class])
+            clear_token_cache()
+
+            def request():
+                response = view(factory.get(
+                    '/api/users/me/', HTTP_AUTHORIZATION=f'Token {token}'))
+                response.render()
+                assert response.status_code == 200, response.data
+
+            # Первый запрос заполняет кеш, затем считаются SQL-запросы
+            request()
+            with CaptureQueriesContext(connection) as queries:
+                request()
+            start = perf_counter()
+            for _ in range(count):
+                request()
+            elapsed = perf_counter() - start
+            self.stdout.write(
+                f"{authentication_class.__name__:<28}"
+                f"{count / elapsed:>12.0f}{len(queries):>15}"
+            )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from core.recipe_index import get_recipe_index
+from core.similarity import DEFAULT_BATCH_SIZE, compute_similar_recipes
+
+
+class Command(BaseCommand):
+    help = "Рассчитывает похожие рецепты для всех рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Число рецептов, сохраняемых за одну транзакцию'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        recipe_ids = list(
+            Recipe.objects.order_by('pk').values_list('pk', flat=True))
+
+        def progress(processed):
+            self.stdout.write(
+                f"Обработано рецептов: {processed} из {len(recipe_ids)}")
+
+        saved = compute_similar_recipes(
+            recipe_ids, get_recipe_index(),
+            batch_size=options['batch_size'], progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово! Сохранено записей: {saved} "
+            f"за {time.perf_counter() - started:.1f} с."
+        ))
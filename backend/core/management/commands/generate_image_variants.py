@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core.images import generate_image_variants
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Строит уменьшенные копии изображений существующих рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить копии, даже если они актуальны'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'image', 'image_variants')
+        built = failed = 0
+        for recipe in recipes.iterator():
+            if (not options['force']
+                    and recipe.image_variants.get('source')
+                    == recipe.image.name):
+                continue
+            try:
+                generate_image_variants(recipe.pk)
+                built += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(self.style.ERROR(
+                    f"Рецепт {recipe.pk}: {e}"
+                ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово! Обработано рецептов: {built}, с ошибками: {failed}."
+        ))
@@ -1,29 +1,41 @@
 import json
 import os
+
 from django.core.management.base import BaseCommand
-from core.models import Ingredient
+
+from core.ingredient_import import DEFAULT_BATCH_SIZE, FORMATS, import_file
 
 
 class Command(BaseCommand):
-    help = "Импортирует ингредиенты из JSON-файла"
+    help = "Импортирует ингредиенты из файла CSV, JSON или NDJSON"
 
-    def handle(self, *args, **kwargs):
-        data_file = os.path.join("data", "ingredients.json")
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join('data', 'ingredients.json'),
+            help='Путь к файлу (по умолчанию data/ingredients.json)'
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла, если он не следует из расширения'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Число записей в одной вставке'
+        )
 
-        try:
-            with open(data_file, encoding="utf-8") as file:
-                ingredients_data = json.load(file)
+    def handle(self, *args, **options):
+        data_file = options['path']
 
-            new_ingredients = []
-            for item in ingredients_data:
-                new_ingredients.append(Ingredient(**item))
+        def progress(read, created):
+            self.stdout.write(
+                f"Обработано записей: {read}, добавлено: {created}")
 
-            created_objects = Ingredient.objects.bulk_create(
-                new_ingredients, ignore_conflicts=True
+        try:
+            read, added_count, invalid = import_file(
+                data_file, options['format'],
+                batch_size=options['batch_size'], progress=progress,
             )
-
-            added_count = len(created_objects)
-
         except FileNotFoundError:
             self.stderr.write(self.style.ERROR(f"Файл {data_file} не найден!"))
             return
@@ -36,6 +48,10 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR(f"Произошла ошибка: {e}"))
             return
 
+        if invalid:
+            self.stderr.write(self.style.WARNING(
+                f"Пропущено некорректных записей: {invalid}"
+            ))
         self.stdout.write(
             self.style.SUCCESS(
                 f"Импорт завершен успешно! Добавлено записей: {added_count}."
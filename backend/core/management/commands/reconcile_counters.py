@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import reconcile_counters
+from core.jobs import enqueue
+
+
+class Command(BaseCommand):
+    help = "Исправляет расхождения в счетчиках рецептов, избранного и подписок"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--background', action='store_true',
+            help='Поставить сверку в очередь фоновых задач'
+        )
+
+    def handle(self, *args, **options):
+        if options['background']:
+            job = enqueue('reconcile_counters')
+            self.stdout.write(self.style.SUCCESS(
+                f"Сверка поставлена в очередь, задача #{job.pk}."
+            ))
+            return
+        fixed = reconcile_counters()
+        for counter, count in fixed.items():
+            self.stdout.write(f"{counter}: исправлено записей {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Сверка завершена, всего исправлено: {sum(fixed.values())}."
+        ))
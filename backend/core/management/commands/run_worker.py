@@ -0,0 +1,75 @@
+import multiprocessing
+import signal
+import threading
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.jobs import work
+
+
+def _process_main(stop, poll_interval, burst):
+    django.setup()
+    # Остановкой управляет родительский процесс через stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(stop, poll_interval, burst)
+
+
+class Command(BaseCommand):
+    help = "Запускает воркер очереди фоновых задач"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Число параллельных исполнителей (по умолчанию 1)'
+        )
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Запускать исполнителей процессами, а не потоками'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Завершиться, когда в очереди не останется готовых задач'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        args = (options['poll_interval'], options['burst'])
+        if options['processes']:
+            # Соединения с БД не должны наследоваться дочерними процессами
+            connections.close_all()
+            stop = multiprocessing.Event()
+            runners = [
+                multiprocessing.Process(
+                    target=_process_main, args=(stop, *args), daemon=True)
+                for _ in range(workers)
+            ]
+        else:
+            stop = threading.Event()
+            runners = [
+                threading.Thread(
+                    target=work, args=(stop, *args), daemon=True)
+                for _ in range(workers)
+            ]
+
+        def shutdown(signum, frame):
+            self.stdout.write("Остановка после текущих задач...")
+            stop.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        kind = 'процессов' if options['processes'] else 'потоков'
+        self.stdout.write(f"Воркер запущен: {workers} {kind}.")
+        for runner in runners:
+            runner.start()
+        for runner in runners:
+            # join с таймаутом, чтобы главный поток получал сигналы
+            while runner.is_alive():
+                runner.join(0.5)
+        self.stdout.write(self.style.SUCCESS("Воркер остановлен."))
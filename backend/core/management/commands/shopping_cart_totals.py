@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from core.models import User
+from core.shopping_cart_totals import find_mismatched_users, refresh_totals
+
+
+class Command(BaseCommand):
+    help = "Проверяет или пересчитывает итоги списков покупок"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать итоги всех пользователей'
+        )
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Пересчитать итоги пользователей с расхождениями'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            user_ids = list(User.objects.values_list('pk', flat=True))
+            refresh_totals(user_ids)
+            self.stdout.write(self.style.SUCCESS(
+                f"Итоги пересчитаны для пользователей: {len(user_ids)}."
+            ))
+            return
+
+        mismatched = find_mismatched_users()
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS("Расхождений не найдено."))
+            return
+        self.stdout.write(self.style.WARNING(
+            f"Расхождения у пользователей: "
+            f"{', '.join(map(str, sorted(mismatched)))}."
+        ))
+        if options['fix']:
+            refresh_totals(mismatched)
+            self.stdout.write(self.style.SUCCESS("Итоги исправлены."))
@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ("Копирует основную базу SQLite в файлы реплик из DB_REPLICAS "
+            "для локальной проверки чтения с реплик")
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError(
+                'Команда нужна только для SQLite, реплики PostgreSQL '
+                'заполняет потоковая репликация.')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены, задайте DB_REPLICAS.')
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            path = settings.DATABASES[alias]['NAME']
+            connections[alias].close()
+            replica = sqlite3.connect(path)
+            try:
+                primary.connection.backup(replica)
+            finally:
+                replica.close()
+            self.stdout.write(f"{alias}: {path}")
+        self.stdout.write(self.style.SUCCESS("Реплики обновлены."))
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-18 03:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_shopping_cart_totals(apps, schema_editor):
+    RecipeIngredient = apps.get_model('core', 'RecipeIngredient')
+    ShoppingCartTotal = apps.get_model('core', 'ShoppingCartTotal')
+    totals = (
+        RecipeIngredient.objects
+        .filter(recipe__shopping_carts__isnull=False)
+        .values('recipe__shopping_carts__user', 'ingredient')
+        .annotate(total_amount=Sum('amount'))
+        .order_by()
+    )
+    ShoppingCartTotal.objects.bulk_create(
+        ShoppingCartTotal(
+            user_id=row['recipe__shopping_carts__user'],
+            ingredient_id=row['ingredient'],
+            total_amount=row['total_amount'],
+        ) for row in totals.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_favorite_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to='core.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+                'constraints': [models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_cart_total')],
+            },
+        ),
+        migrations.RunPython(
+            fill_shopping_cart_totals, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:05
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    Recipe = apps.get_model('core', 'Recipe')
+    Favorite = apps.get_model('core', 'Favorite')
+    Subscription = apps.get_model('core', 'Subscription')
+    User.objects.update(
+        recipes_count=count_related(Recipe, 'author'),
+        subscriptions_count=count_related(Subscription, 'user'),
+        subscribers_count=count_related(Subscription, 'author'),
+    )
+    Recipe.objects.update(favorites_count=count_related(Favorite, 'recipe'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_shoppingcarttotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлено в избранное'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscriptions_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число подписок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_favorites_count_user_recipes_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-date_published', '-id'], name='recipe_published_id_idx'),
+        ),
+    ]
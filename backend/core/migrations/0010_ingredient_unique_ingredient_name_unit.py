@@ -0,0 +1,63 @@
+# Generated by Django 5.1.4 on 2026-10-18 06:55
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_rows(model, owner, duplicate_id, keeper_id, field, limit=None):
+    """Переносит строки model с ингредиента-дубля на оставляемый.
+
+    Если у владельца уже есть строка с оставляемым ингредиентом,
+    количества складываются.
+    """
+    for row in model.objects.filter(ingredient_id=duplicate_id):
+        existing = model.objects.filter(
+            ingredient_id=keeper_id,
+            **{owner: getattr(row, owner)},
+        ).first()
+        if existing is None:
+            row.ingredient_id = keeper_id
+            row.save(update_fields=['ingredient'])
+            continue
+        total = getattr(existing, field) + getattr(row, field)
+        setattr(existing, field, min(total, limit) if limit else total)
+        existing.save(update_fields=[field])
+        row.delete()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('core', 'Ingredient')
+    RecipeIngredient = apps.get_model('core', 'RecipeIngredient')
+    ShoppingCartTotal = apps.get_model('core', 'ShoppingCartTotal')
+    duplicates = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(keeper_id=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for group in duplicates:
+        duplicate_ids = Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).exclude(id=group['keeper_id']).values_list('id', flat=True)
+        for duplicate_id in list(duplicate_ids):
+            merge_rows(RecipeIngredient, 'recipe_id', duplicate_id,
+                       group['keeper_id'], 'amount', limit=32000)
+            merge_rows(ShoppingCartTotal, 'user_id', duplicate_id,
+                       group['keeper_id'], 'total_amount')
+            Ingredient.objects.filter(id=duplicate_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_unit'),
+        ),
+    ]
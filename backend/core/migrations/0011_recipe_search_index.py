@@ -0,0 +1,88 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:40
+
+from django.db import migrations
+
+# SQL записан здесь, а не импортируется из core.search, чтобы миграция
+# не менялась вместе с кодом приложения
+
+POSTGRESQL_INSTALL = (
+    """
+    ALTER TABLE core_recipe ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(text, '')), 'B')
+    ) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS recipe_search_vector_idx
+    ON core_recipe USING GIN (search_vector)
+    """,
+)
+POSTGRESQL_UNINSTALL = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'ALTER TABLE core_recipe DROP COLUMN IF EXISTS search_vector',
+)
+
+SQLITE_INSTALL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_recipe_fts USING fts5(
+        name, text, content='core_recipe', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_recipe_fts_insert
+    AFTER INSERT ON core_recipe BEGIN
+        INSERT INTO core_recipe_fts(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_recipe_fts_delete
+    AFTER DELETE ON core_recipe BEGIN
+        INSERT INTO core_recipe_fts(core_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_recipe_fts_update
+    AFTER UPDATE OF name, text ON core_recipe BEGIN
+        INSERT INTO core_recipe_fts(core_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO core_recipe_fts(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    "INSERT INTO core_recipe_fts(core_recipe_fts) VALUES ('rebuild')",
+)
+SQLITE_UNINSTALL = (
+    'DROP TRIGGER IF EXISTS core_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS core_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS core_recipe_fts_update',
+    'DROP TABLE IF EXISTS core_recipe_fts',
+)
+
+
+def run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for statement in statements_by_vendor.get(vendor, ()):
+            schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_ingredient_unique_ingredient_name_unit'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRESQL_INSTALL,
+                 'sqlite': SQLITE_INSTALL}),
+            run({'postgresql': POSTGRESQL_UNINSTALL,
+                 'sqlite': SQLITE_UNINSTALL}),
+        ),
+    ]
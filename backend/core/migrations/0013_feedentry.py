@@ -0,0 +1,56 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:30
+
+from itertools import groupby
+from operator import itemgetter
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_feeds(apps, schema_editor):
+    FeedEntry = apps.get_model('core', 'FeedEntry')
+    Recipe = apps.get_model('core', 'Recipe')
+    Subscription = apps.get_model('core', 'Subscription')
+    subscriptions = Subscription.objects.filter(
+        author__subscribers_count__lte=settings.FEED_FANOUT_MAX_SUBSCRIBERS,
+    ).order_by('user_id').values_list('user_id', 'author_id')
+    for user_id, rows in groupby(subscriptions.iterator(),
+                                 key=itemgetter(0)):
+        # Как и после trim_feeds, в ленте только FEED_MAX_ENTRIES
+        # последних рецептов всех авторов пользователя
+        recipes = (
+            Recipe.objects.filter(
+                author_id__in=[author_id for _, author_id in rows])
+            .order_by('-date_published', '-id')
+            .values_list('pk', flat=True)[:settings.FEED_MAX_ENTRIES]
+        )
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user_id=user_id, recipe_id=recipe_id)
+             for recipe_id in recipes],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='core.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи лент',
+                'constraints': [models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_entry')],
+            },
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
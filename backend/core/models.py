@@ -23,6 +23,12 @@ class Ingredient(models.Model):
         verbose_name = 'ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_name_unit'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -55,6 +61,21 @@ class User(AbstractUser):
         blank=True,
         default='users/default_avatar.png'
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    subscriptions_count = models.PositiveIntegerField(
+        verbose_name='Число подписок',
+        default=0,
+        editable=False,
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -90,6 +111,12 @@ class Recipe(models.Model):
         verbose_name='Изображение',
         upload_to='recipes/images/',
     )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления в минутах',
         validators=[MinValueValidator(
@@ -99,15 +126,42 @@ class Recipe(models.Model):
         default=now,
         verbose_name='Дата публикации'
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Добавлено в избранное',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-date_published']
+        indexes = [
+            # Для курсорной пагинации ленты по (date_published, id)
+            models.Index(
+                fields=['-date_published', '-id'],
+                name='recipe_published_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def get_image_variants(self):
+        """Возвращает пути готовых копий изображения: {размер: {формат: путь}}.
+
+        Копии, построенные по предыдущему изображению, не возвращаются.
+        """
+        if (not self.image
+                or self.image_variants.get('source') != self.image.name):
+            return {}
+        return self.image_variants.get('variants', {})
+
+    def ingredient_ids(self):
+        """Возвращает список id ингредиентов рецепта."""
+        return list(self.recipe_ingredients.values_list(
+            'ingredient_id', flat=True))
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
@@ -227,3 +281,158 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'Рецепт {self.recipe.name} в списке покупок у {self.user.username}'
+
+
+class ShoppingCartTotal(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя.
+
+    Поддерживается в актуальном состоянии при изменении корзины и состава
+    рецептов (см. core.shopping_cart_totals), чтобы скачивание списка
+    покупок было одним чтением по индексу.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='shopping_cart_totals',
+        on_delete=models.CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        related_name='shopping_cart_totals',
+        on_delete=models.CASCADE,
+    )
+    total_amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_total'
+            )
+        ]
+
+    def __str__(self):
+        return (f'{self.total_amount} {self.ingredient.name} '
+                f'у {self.user.username}')
+
+
+class SimilarRecipe(models.Model):
+    """Рецепт, близкий к другому по составу ингредиентов.
+
+    Для каждого рецепта хранятся лучшие совпадения с их схожестью
+    (см. core.similarity), чтобы выдача похожих рецептов была чтением
+    по индексу.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='similar_recipes',
+        on_delete=models.CASCADE,
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        verbose_name='Похожий рецепт',
+        related_name='similar_to',
+        on_delete=models.CASCADE,
+    )
+    score = models.FloatField(verbose_name='Схожесть')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-score', '-similar')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.similar.name} похож на {self.recipe.name}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя.
+
+    Записи создаются при публикации рецепта для всех подписчиков автора
+    (см. core.feed), поэтому лента читается без JOIN подписок с рецептами.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe.name} в ленте {self.user.username}'
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди, которую выполняет manage.py run_worker.
+
+    Выполненные задачи удаляются, задачи с ошибкой остаются для разбора.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(verbose_name='Задача', max_length=100)
+    payload = models.JSONField(verbose_name='Параметры', default=dict)
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток', default=5)
+    run_after = models.DateTimeField(verbose_name='Выполнить после')
+    locked_until = models.DateTimeField(
+        verbose_name='Занята до', null=True, blank=True)
+    last_error = models.TextField(verbose_name='Последняя ошибка', blank=True)
+    created_at = models.DateTimeField(
+        verbose_name='Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('run_after', 'id')
+        indexes = [
+            models.Index(fields=['status', 'run_after'],
+                         name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
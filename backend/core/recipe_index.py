@@ -0,0 +1,248 @@
+"""Обратный индекс состава рецептов в памяти процесса.
+
+Для каждого ингредиента хранится отсортированный массив id рецептов,
+в которые он входит, а для каждого рецепта - его ингредиенты, то есть
+разреженная матрица рецепт×ингредиент по строкам и по столбцам. Подбор
+рецептов по набору ингредиентов - это объединение их массивов и подсчет
+вхождений средствами NumPy, без JOIN по RecipeIngredient.
+
+Изменение состава рецепта не перестраивает индекс: после коммита процесс,
+который его записал, применяет новый состав этих рецептов к своему индексу.
+Остальные процессы узнают о записи по смене версии и перестраивают индекс
+в фоновом потоке, продолжая отвечать по прежнему.
+"""
+import copy
+import logging
+from threading import Lock, Thread
+
+import numpy as np
+from django.db import connection, transaction
+
+from core.db_router import use_primary
+from core.models import RecipeIngredient
+from core.versions import RECIPE_INGREDIENTS_VERSION, bump_version, get_version
+
+logger = logging.getLogger(__name__)
+
+
+class RecipeIngredientIndex:
+    """Рецепты по ингредиентам и ингредиенты по рецептам в формате CSR.
+
+    Рецепты ингредиента ingredient_ids[i] лежат в
+    recipe_ids[offsets[i]:offsets[i + 1]], ингредиенты рецепта recipes[j] -
+    в recipe_ingredients[recipe_offsets[j]:recipe_offsets[j + 1]].
+    """
+
+    def __init__(self, pairs):
+        pairs = np.array(list(pairs), dtype=np.int64).reshape(-1, 2)
+        # Сортировка по ингредиенту, внутри - по рецепту
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+        self.ingredient_ids, starts = np.unique(
+            pairs[:, 0], return_index=True)
+        self.offsets = np.append(starts, len(pairs))
+        self.recipe_ids = pairs[:, 1]
+        # Число ингредиентов в каждом рецепте
+        self.recipes, self.sizes = np.unique(
+            self.recipe_ids, return_counts=True)
+        by_recipe = np.argsort(self.recipe_ids, kind='stable')
+        self.recipe_ingredients = pairs[by_recipe, 0]
+        self.recipe_offsets = np.append(0, np.cumsum(self.sizes))
+        self.set_changes({})
+
+    def set_changes(self, changes):
+        """Составы рецептов, измененных после построения массивов.
+
+        changes - {id рецепта: отсортированный массив ингредиентов}, пустой
+        массив - рецепт удален. Они перекрывают данные массивов CSR.
+        """
+        self.changes = changes
+        self.changed_ids = np.array(sorted(changes), dtype=np.int64)
+        by_ingredient = {}
+        for recipe_id in self.changed_ids.tolist():
+            for ingredient_id in changes[recipe_id].tolist():
+                by_ingredient.setdefault(ingredient_id, []).append(recipe_id)
+        self.changed_postings = {
+            ingredient_id: np.array(recipe_ids, dtype=np.int64)
+            for ingredient_id, recipe_ids in by_ingredient.items()
+        }
+
+    def updated(self, changes):
+        """Копия индекса с новыми составами рецептов.
+
+        changes - {id рецепта: id ингредиентов}, пустой набор - рецепт
+        удален. Массивы CSR копия делит с исходным индексом.
+        """
+        index = copy.copy(self)
+        index.set_changes({**self.changes, **{
+            recipe_id: np.unique(np.array(list(ingredient_ids),
+                                          dtype=np.int64))
+            for recipe_id, ingredient_ids in changes.items()
+        }})
+        return index
+
+    def postings(self, ingredient_id):
+        """Отсортированный массив рецептов с ингредиентом ingredient_id."""
+        position = np.searchsorted(self.ingredient_ids, ingredient_id)
+        if (position == len(self.ingredient_ids)
+                or self.ingredient_ids[position] != ingredient_id):
+            recipes = self.recipe_ids[:0]
+        else:
+            recipes = self.recipe_ids[
+                self.offsets[position]:self.offsets[position + 1]]
+        if not self.changes:
+            return recipes
+        recipes = recipes[~np.isin(recipes, self.changed_ids)]
+        changed = self.changed_postings.get(ingredient_id)
+        if changed is None:
+            return recipes
+        return np.union1d(recipes, changed)
+
+    def ingredients(self, recipe_id):
+        """Массив ингредиентов рецепта recipe_id."""
+        if recipe_id in self.changes:
+            return self.changes[recipe_id]
+        position = np.searchsorted(self.recipes, recipe_id)
+        if (position == len(self.recipes)
+                or self.recipes[position] != recipe_id):
+            return self.recipe_ingredients[:0]
+        return self.recipe_ingredients[
+            self.recipe_offsets[position]:self.recipe_offsets[position + 1]]
+
+    def overlap(self, ingredient_ids):
+        """Рецепты, в которых есть хотя бы один из ingredient_ids.
+
+        Возвращает массивы (id рецептов, число общих ингредиентов,
+        число ингредиентов в рецепте), упорядоченные по id.
+        """
+        found = [self.postings(pk) for pk in set(ingredient_ids)]
+        if not found:
+            empty = self.recipe_ids[:0]
+            return empty, empty, empty
+        recipes, common = np.unique(np.concatenate(found), return_counts=True)
+        return recipes, common, self.recipe_sizes(recipes)
+
+    def recipe_sizes(self, recipes):
+        """Число ингредиентов рецептов recipes, которые есть в индексе."""
+        if not self.changes:
+            return self.sizes[np.searchsorted(self.recipes, recipes)]
+        sizes = np.empty(len(recipes), dtype=np.int64)
+        changed = np.isin(recipes, self.changed_ids)
+        sizes[~changed] = self.sizes[
+            np.searchsorted(self.recipes, recipes[~changed])]
+        sizes[changed] = [
+            len(self.changes[recipe_id])
+            for recipe_id in recipes[changed].tolist()
+        ]
+        return sizes
+
+    def match(self, ingredient_ids, max_missing=None):
+        """Рецепты, в которых есть хотя бы один из ingredient_ids.
+
+        Возвращает массивы (id рецептов, число недостающих ингредиентов),
+        отсортированные по недостающим, затем от новых рецептов к старым.
+        """
+        recipes, available, sizes = self.overlap(ingredient_ids)
+        missing = sizes - available
+        if max_missing is not None:
+            keep = missing <= max_missing
+            recipes, missing = recipes[keep], missing[keep]
+        # lexsort берет последний ключ как главный
+        order = np.lexsort((-recipes, missing))
+        return recipes[order], missing[order]
+
+
+_index = None
+_index_version = None
+# Изменения, примененные в этом процессе во время фоновой перестройки
+_pending = None
+_lock = Lock()
+
+
+def _build_index():
+    # Индекс живет до смены версии, реплика могла отстать
+    with use_primary():
+        return RecipeIngredientIndex(
+            RecipeIngredient.objects.values_list(
+                'ingredient_id', 'recipe_id').order_by()
+        )
+
+
+def _rebuild(version):
+    global _index, _index_version, _pending
+    try:
+        index = _build_index()
+    except Exception:
+        logger.exception('Не удалось перестроить индекс состава рецептов')
+        index = None
+    finally:
+        connection.close()
+    with _lock:
+        if index is not None:
+            _index = index.updated(_pending) if _pending else index
+            _index_version = version
+        _pending = None
+
+
+def get_recipe_index():
+    """Возвращает индекс состава рецептов.
+
+    Первый вызов в процессе строит индекс сразу. После смены версии
+    индекс перестраивается в фоновом потоке, а до его готовности
+    возвращается прежний.
+    """
+    global _index, _index_version, _pending
+    version = get_version(RECIPE_INGREDIENTS_VERSION)
+    if _index is not None and _index_version == version:
+        return _index
+    with _lock:
+        if _index is None:
+            _index = _build_index()
+            _index_version = version
+        elif _index_version != version and _pending is None:
+            _pending = {}
+            Thread(target=_rebuild, args=(version,), daemon=True).start()
+        return _index
+
+
+def apply_recipe_changes(changes):
+    """Применяет к индексу процесса новые составы рецептов.
+
+    changes - {id рецепта: id ингредиентов}, пустой набор - рецепт удален.
+    Возвращает обновленный индекс.
+    """
+    global _index, _index_version
+    with _lock:
+        if _index is None:
+            _index_version = get_version(RECIPE_INGREDIENTS_VERSION)
+            _index = _build_index()
+        _index = _index.updated(changes)
+        if _pending is not None:
+            _pending.update(changes)
+        return _index
+
+
+def load_recipe_ingredients(recipe_ids):
+    """Текущий состав рецептов recipe_ids: {id рецепта: id ингредиентов}."""
+    changes = {recipe_id: set() for recipe_id in recipe_ids}
+    with use_primary():
+        for ingredient_id, recipe_id in (
+                RecipeIngredient.objects.filter(recipe__in=recipe_ids)
+                .values_list('ingredient_id', 'recipe_id')):
+            changes[recipe_id].add(ingredient_id)
+    return changes
+
+
+def invalidate_recipe_index(recipe_ids):
+    """Отмечает изменение состава рецептов recipe_ids.
+
+    После коммита текущей транзакции меняет версию индекса для других
+    процессов и применяет новый состав к индексу этого процесса.
+    """
+    recipe_ids = list(recipe_ids)
+
+    def update():
+        bump_version(RECIPE_INGREDIENTS_VERSION)
+        if _index is not None:
+            apply_recipe_changes(load_recipe_ingredients(recipe_ids))
+
+    transaction.on_commit(update)
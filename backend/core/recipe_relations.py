@@ -0,0 +1,112 @@
+"""Пакетное добавление рецептов в избранное и корзину и удаление из них.
+
+Связи создаются одним INSERT ... ON CONFLICT DO NOTHING и удаляются одним
+DELETE, оба с RETURNING: статусы и изменения счетчиков берутся из строк,
+которые база действительно вставила или удалила, поэтому параллельные
+запросы не посчитают одну связь дважды. Сигналы при этом не
+отправляются: счетчики, итоги корзины и версии данных обновляются здесь
+явно.
+"""
+from django.db import connections, router, transaction
+
+from core.counters import change_counters
+from core.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from core.shopping_cart_totals import refresh_totals
+from core.versions import bump_user_versions
+
+ADDED = 'added'
+REMOVED = 'removed'
+ALREADY_ADDED = 'already_added'
+NOT_IN_LIST = 'not_in_list'
+NOT_FOUND = 'not_found'
+
+
+def _changed(model, user, recipe_ids):
+    """Обновляет все, что зависит от связей model пользователя user."""
+    if not recipe_ids:
+        return
+    bump_user_versions([user.pk])
+    if model is ShoppingCart:
+        refresh_totals(
+            [user.pk],
+            set(RecipeIngredient.objects.filter(recipe__in=recipe_ids)
+                .values_list('ingredient_id', flat=True)),
+        )
+
+
+def _execute_returning(model, sql, params):
+    """Выполняет запрос к таблице model, возвращает id рецептов из RETURNING.
+
+    В sql подставляются имена таблицы и столбцов user и recipe.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    sql = sql.format(
+        table=quote(model._meta.db_table),
+        user=quote(model._meta.get_field('user').column),
+        recipe=quote(model._meta.get_field('recipe').column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _insert(model, user, recipe_ids):
+    """Создает связи, которых еще нет; возвращает id вставленных рецептов."""
+    if not recipe_ids:
+        return set()
+    values = ', '.join(['(%s, %s)'] * len(recipe_ids))
+    return _execute_returning(
+        model,
+        f'INSERT INTO {{table}} ({{user}}, {{recipe}}) VALUES {values} '
+        'ON CONFLICT DO NOTHING RETURNING {recipe}',
+        [value for recipe_id in recipe_ids for value in (user.pk, recipe_id)],
+    )
+
+
+def _delete(model, user, recipe_ids):
+    """Удаляет связи; возвращает id рецептов, чьи строки удалены."""
+    if not recipe_ids:
+        return set()
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    return _execute_returning(
+        model,
+        f'DELETE FROM {{table}} WHERE {{user}} = %s '
+        f'AND {{recipe}} IN ({placeholders}) RETURNING {{recipe}}',
+        [user.pk, *recipe_ids],
+    )
+
+
+def add_recipes(model, user, recipe_ids):
+    """Добавляет рецепты в избранное или корзину: {id: статус}."""
+    with transaction.atomic():
+        found = set(Recipe.objects.filter(pk__in=recipe_ids)
+                    .values_list('pk', flat=True))
+        new = _insert(model, user, sorted(found))
+        if model is Favorite:
+            change_counters(Recipe, new, 'favorites_count', 1)
+        _changed(model, user, new)
+    return {
+        recipe_id: ADDED if recipe_id in new
+        else ALREADY_ADDED if recipe_id in found
+        else NOT_FOUND
+        for recipe_id in recipe_ids
+    }
+
+
+def remove_recipes(model, user, recipe_ids):
+    """Удаляет рецепты из избранного или корзины: {id: статус}."""
+    with transaction.atomic():
+        removed = _delete(model, user, sorted(set(recipe_ids)))
+        found = removed | set(
+            Recipe.objects.filter(pk__in=set(recipe_ids) - removed)
+            .values_list('pk', flat=True))
+        if model is Favorite:
+            change_counters(Recipe, removed, 'favorites_count', -1)
+        _changed(model, user, removed)
+    return {
+        recipe_id: REMOVED if recipe_id in removed
+        else NOT_IN_LIST if recipe_id in found
+        else NOT_FOUND
+        for recipe_id in recipe_ids
+    }
@@ -0,0 +1,126 @@
+"""Полнотекстовый поиск рецептов по названию и описанию.
+
+В PostgreSQL поиск идет по сгенерированному столбцу search_vector
+(tsvector с GIN-индексом), в SQLite - по таблице FTS5 с внешним
+содержимым core_recipe. Оба индекса обновляет сама база: столбец
+генерируется при записи строки, таблицу FTS5 синхронизируют триггеры.
+Название весит больше описания.
+
+Запрос разбивается на слова, каждое ищется как префикс, все слова
+должны встретиться в рецепте.
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'core_recipe_fts'
+MAX_SEARCH_TERMS = 10
+
+# Таблицу FTS5 и триггеры создает миграция 0011_recipe_search_index,
+# здесь триггеры восстанавливаются после миграций
+SQLITE_TRIGGER_NAMES = (
+    'core_recipe_fts_insert',
+    'core_recipe_fts_delete',
+    'core_recipe_fts_update',
+)
+SQLITE_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS core_recipe_fts_insert
+    AFTER INSERT ON core_recipe BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS core_recipe_fts_delete
+    AFTER DELETE ON core_recipe BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS core_recipe_fts_update
+    AFTER UPDATE OF name, text ON core_recipe BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+)
+SQLITE_REBUILD = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+
+def ensure_sqlite_triggers(db=connection):
+    """Восстанавливает триггеры FTS5 и перестраивает индекс.
+
+    SQLite теряет триггеры, когда миграция пересоздает таблицу
+    core_recipe, поэтому функция вызывается и после каждой миграции.
+    """
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+        if cursor.fetchone() is None:
+            return
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+            "AND name IN (%s, %s, %s)", SQLITE_TRIGGER_NAMES)
+        if cursor.fetchone()[0] == len(SQLITE_TRIGGER_NAMES):
+            return
+        for statement in SQLITE_TRIGGERS:
+            cursor.execute(statement)
+        cursor.execute(SQLITE_REBUILD)
+
+
+def search_terms(query):
+    """Слова запроса без знаков препинания и операторов."""
+    return re.findall(r'\w+', query.lower())[:MAX_SEARCH_TERMS]
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, с релевантностью search_rank.
+
+    Чем больше search_rank, тем выше рецепт в выдаче. На базах без
+    полнотекстового поиска ищется вхождение каждого слова.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.annotate(search_rank=Value(0.0)).none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.alias(
+            search_match=RawSQL(
+                "core_recipe.search_vector @@ to_tsquery('russian', %s)",
+                [tsquery], output_field=BooleanField()),
+        ).filter(search_match=True).annotate(
+            search_rank=RawSQL(
+                "ts_rank(core_recipe.search_vector, "
+                "to_tsquery('russian', %s))",
+                [tsquery], output_field=FloatField()),
+        )
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # bm25 считается только в запросе с MATCH по таблице FTS5, поэтому
+        # релевантность берется подзапросом по rowid найденного рецепта.
+        # bm25 отрицателен и тем меньше, чем релевантнее рецепт
+        return queryset.filter(
+            pk__in=RawSQL(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                [match]),
+        ).annotate(
+            search_rank=RawSQL(
+                f'WITH ranks AS MATERIALIZED ('
+                f'SELECT rowid AS id, -bm25({FTS_TABLE}, 10.0, 1.0) AS rank '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s) '
+                'SELECT rank FROM ranks WHERE id = core_recipe.id',
+                [match], output_field=FloatField()),
+        )
+    for term in terms:
+        queryset = queryset.filter(
+            Q(name__icontains=term) | Q(text__icontains=term))
+    return queryset.annotate(search_rank=Value(0.0))
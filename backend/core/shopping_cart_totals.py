@@ -0,0 +1,84 @@
+"""Поддержка итогов списков покупок (модель ShoppingCartTotal).
+
+Итоги пересчитываются только для затронутых пар (пользователь,
+ингредиент) в той же транзакции, что и изменение корзины или рецепта:
+сигналами корзины, рецепта и состава рецепта (core.signals), а после
+массовых операций без сигналов - явным вызовом refresh_totals.
+"""
+from django.db import transaction
+from django.db.models import Sum
+
+from core.models import RecipeIngredient, ShoppingCartTotal, User
+
+
+def compute_totals(user_ids=None, ingredient_ids=None):
+    """Считает итоги по корзинам: {(user_id, ingredient_id): amount}."""
+    # Условия на корзину задаются одним filter(), чтобы JOIN был один
+    lookups = {'recipe__shopping_carts__isnull': False}
+    if user_ids is not None:
+        lookups['recipe__shopping_carts__user__in'] = user_ids
+    if ingredient_ids is not None:
+        lookups['ingredient__in'] = ingredient_ids
+    rows = (
+        RecipeIngredient.objects.filter(**lookups)
+        .values('recipe__shopping_carts__user', 'ingredient')
+        .annotate(total_amount=Sum('amount'))
+        .order_by()
+    )
+    return {
+        (row['recipe__shopping_carts__user'], row['ingredient']):
+            row['total_amount']
+        for row in rows
+    }
+
+
+def refresh_totals(user_ids, ingredient_ids=None):
+    """Пересчитывает итоги пользователей user_ids по ingredient_ids.
+
+    Если ingredient_ids не передан, пересчитываются все ингредиенты.
+    """
+    user_ids = list(user_ids)
+    if not user_ids or ingredient_ids is not None and not ingredient_ids:
+        return
+    with transaction.atomic():
+        # Блокируем пользователей, чтобы параллельные изменения корзины
+        # одного пользователя пересчитывались по очереди
+        list(User.objects.select_for_update()
+             .filter(pk__in=user_ids).values_list('pk', flat=True))
+        stale = ShoppingCartTotal.objects.filter(user__in=user_ids)
+        if ingredient_ids is not None:
+            stale = stale.filter(ingredient__in=ingredient_ids)
+        stale.delete()
+        ShoppingCartTotal.objects.bulk_create(
+            ShoppingCartTotal(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=amount,
+            )
+            for (user_id, ingredient_id), amount
+            in compute_totals(user_ids, ingredient_ids).items()
+        )
+
+
+def refresh_recipe_totals(recipe, ingredient_ids=None):
+    """Пересчитывает итоги всех, у кого рецепт лежит в корзине."""
+    if ingredient_ids is None:
+        ingredient_ids = recipe.ingredient_ids()
+    refresh_totals(
+        recipe.shopping_carts.values_list('user_id', flat=True),
+        list(ingredient_ids)
+    )
+
+
+def find_mismatched_users():
+    """Возвращает id пользователей, чьи итоги разошлись с корзинами."""
+    stored = {
+        (row.user_id, row.ingredient_id): row.total_amount
+        for row in ShoppingCartTotal.objects.all().iterator()
+    }
+    expected = compute_totals()
+    return {
+        user_id for user_id, ingredient_id in stored.keys() | expected.keys()
+        if stored.get((user_id, ingredient_id))
+        != expected.get((user_id, ingredient_id))
+    }
@@ -0,0 +1,187 @@
+from django.db import connections
+from django.db.models import QuerySet
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.counters import change_counter
+from core.feed import add_author_to_feed, remove_author_from_feed
+from core.images import schedule_image_variants
+from core.jobs import enqueue
+from core.ingredient_index import invalidate_ingredient_index
+from core.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    SimilarRecipe, Subscription, User
+)
+from core.recipe_index import invalidate_recipe_index
+from core.search import ensure_sqlite_triggers
+from core.shopping_cart_totals import refresh_totals
+from core.similarity import schedule_similar_recipes
+from core.versions import (
+    bump_auth_versions, bump_recipe_versions, bump_user_versions
+)
+
+
+def deleted_directly(origin, model):
+    """Удаление начато с объектов model, а не каскадом от других моделей."""
+    if isinstance(origin, QuerySet):
+        return origin.model is model
+    return isinstance(origin, model)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(**kwargs):
+    invalidate_ingredient_index()
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_saving(instance, **kwargs):
+    instance.previous_image = (
+        Recipe.objects.filter(pk=instance.pk)
+        .values_list('image', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+        enqueue('fan_out_recipe', recipe_id=instance.pk)
+    bump_recipe_versions([instance.pk])
+    schedule_image_variants(instance, instance.previous_image)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(instance, **kwargs):
+    # Рецепты, у которых удаляемый был среди похожих, получат замену
+    schedule_similar_recipes(
+        SimilarRecipe.objects.filter(similar=instance)
+        .values_list('recipe_id', flat=True)
+    )
+    # Корзины и состав удалятся каскадом, итоги пересчитает recipe_deleted
+    instance.cart_user_ids = list(
+        instance.shopping_carts.values_list('user_id', flat=True))
+    instance.cart_ingredient_ids = (
+        instance.ingredient_ids() if instance.cart_user_ids else [])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+    bump_recipe_versions([instance.pk])
+    refresh_totals(getattr(instance, 'cart_user_ids', []),
+                   getattr(instance, 'cart_ingredient_ids', []))
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_saving(instance, **kwargs):
+    # В админке у строки состава можно сменить ингредиент: итоги корзин
+    # пересчитываются и по прежнему ингредиенту
+    instance.previous_ingredient_id = (
+        RecipeIngredient.objects.filter(pk=instance.pk)
+        .values_list('ingredient_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+def recipe_ingredient_changed(instance):
+    bump_recipe_versions([instance.recipe_id])
+    invalidate_recipe_index([instance.recipe_id])
+    schedule_similar_recipes([instance.recipe_id])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(instance, **kwargs):
+    recipe_ingredient_changed(instance)
+    refresh_totals(
+        ShoppingCart.objects.filter(recipe_id=instance.recipe_id)
+        .values_list('user_id', flat=True),
+        {instance.ingredient_id, instance.previous_ingredient_id} - {None},
+    )
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(instance, origin=None, **kwargs):
+    recipe_ingredient_changed(instance)
+    if deleted_directly(origin, RecipeIngredient):
+        refresh_totals(
+            ShoppingCart.objects.filter(recipe_id=instance.recipe_id)
+            .values_list('user_id', flat=True),
+            [instance.ingredient_id],
+        )
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, created, update_fields=None, **kwargs):
+    # Вход в систему обновляет только last_login, рецепты от него не зависят
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_user_versions([instance.pk])
+    # Смена пароля, деактивация и правка профиля
+    bump_auth_versions([instance.pk])
+    bump_recipe_versions(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    # Выход из системы (djoser token/logout) удаляет токен
+    bump_auth_versions([instance.user_id])
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+    bump_user_versions([instance.user_id])
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+    bump_user_versions([instance.user_id])
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_created(instance, created, **kwargs):
+    if created:
+        refresh_totals([instance.user_id], recipe_ingredient_ids(instance))
+    bump_user_versions([instance.user_id])
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(instance, origin=None, **kwargs):
+    # При удалении рецепта итоги пересчитывает recipe_deleted,
+    # при удалении пользователя они удаляются каскадом
+    if deleted_directly(origin, ShoppingCart):
+        refresh_totals([instance.user_id], recipe_ingredient_ids(instance))
+    bump_user_versions([instance.user_id])
+
+
+def recipe_ingredient_ids(cart):
+    return list(RecipeIngredient.objects.filter(recipe_id=cart.recipe_id)
+                .values_list('ingredient_id', flat=True))
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.user_id, 'subscriptions_count', 1)
+        change_counter(User, instance.author_id, 'subscribers_count', 1)
+        add_author_to_feed(instance.user_id, instance.author_id)
+    bump_user_versions([instance.user_id])
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(instance, **kwargs):
+    change_counter(User, instance.user_id, 'subscriptions_count', -1)
+    change_counter(User, instance.author_id, 'subscribers_count', -1)
+    remove_author_from_feed(instance.user_id, instance.author_id)
+    bump_user_versions([instance.user_id])
+
+
+@receiver(post_migrate)
+def restore_search_triggers(using, **kwargs):
+    ensure_sqlite_triggers(connections[using])
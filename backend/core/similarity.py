@@ -0,0 +1,164 @@
+"""Похожие рецепты по составу ингредиентов.
+
+Схожесть двух рецептов - коэффициент Жаккара их наборов ингредиентов:
+число общих ингредиентов, деленное на число ингредиентов в объединении.
+Для одного рецепта он считается сразу по всем рецептам с общими
+ингредиентами: число общих дает подсчет вхождений по обратному индексу
+(core.recipe_index), размеры рецептов хранятся там же.
+
+Лучшие SIMILAR_RECIPES_LIMIT совпадений каждого рецепта лежат в
+SimilarRecipe, поэтому выдача похожих - чтение по индексу. Таблицу
+заполняет пачками команда build_similar_recipes, а после изменения
+состава рецепта ее обновляет фоновая задача refresh_similar_recipes.
+"""
+from itertools import islice
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min
+
+from core.jobs import enqueue, register_job
+from core.models import Recipe, SimilarRecipe
+from core.recipe_index import (
+    apply_recipe_changes, get_recipe_index, load_recipe_ingredients
+)
+
+SIMILAR_RECIPES_LIMIT = 10
+DEFAULT_BATCH_SIZE = 500
+
+
+def _batches(ids, size):
+    ids = iter(ids)
+    while batch := list(islice(ids, size)):
+        yield batch
+
+
+def similarity_scores(index, ingredient_ids):
+    """Схожесть набора ingredient_ids с рецептами, где есть общие.
+
+    Возвращает массивы (id рецептов, коэффициент Жаккара).
+    """
+    recipes, common, sizes = index.overlap(ingredient_ids)
+    union = len(set(ingredient_ids)) + sizes - common
+    return recipes, common / np.maximum(union, 1)
+
+
+def top_similar(index, recipe_id, limit=SIMILAR_RECIPES_LIMIT):
+    """Самые похожие на recipe_id рецепты: от большей схожести к меньшей,
+    при равной - от новых к старым.
+    """
+    recipes, scores = similarity_scores(index, index.ingredients(recipe_id))
+    other = recipes != recipe_id
+    recipes, scores = recipes[other], scores[other]
+    if len(recipes) > limit:
+        # Отбрасываем все, что хуже limit-го результата, не сортируя
+        threshold = np.partition(scores, len(scores) - limit)[-limit]
+        keep = scores >= threshold
+        recipes, scores = recipes[keep], scores[keep]
+    order = np.lexsort((-recipes, -scores))[:limit]
+    return recipes[order], scores[order]
+
+
+def compute_similar_recipes(recipe_ids, index=None,
+                            batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Пересчитывает похожие рецепты для recipe_ids пачками по batch_size.
+
+    progress(обработано рецептов) вызывается после каждой пачки.
+    Возвращает число сохраненных записей.
+    """
+    index = index or get_recipe_index()
+    processed = saved = 0
+    for batch in _batches(recipe_ids, batch_size):
+        found = {
+            recipe_id: top_similar(index, recipe_id) for recipe_id in batch
+        }
+        # Индекс может отставать от удаленных только что рецептов
+        existing = set(Recipe.objects.filter(pk__in={
+            *batch,
+            *(pk for similar, _ in found.values() for pk in similar.tolist()),
+        }).values_list('pk', flat=True))
+        rows = [
+            SimilarRecipe(recipe_id=recipe_id, similar_id=pk, score=score)
+            for recipe_id, (similar, scores) in found.items()
+            if recipe_id in existing
+            for pk, score in zip(similar.tolist(), scores.tolist())
+            if pk in existing
+        ]
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(recipe_id__in=batch).delete()
+            SimilarRecipe.objects.bulk_create(rows)
+        processed += len(batch)
+        saved += len(rows)
+        if progress is not None:
+            progress(processed)
+    return saved
+
+
+def _improved_recipes(recipes, scores):
+    """Рецепты из recipes, в список похожих которых попадает рецепт
+    со схожестью scores: список еще не заполнен или худшая запись в нем
+    не лучше.
+    """
+    improved = []
+    for batch in _batches(range(len(recipes)), DEFAULT_BATCH_SIZE):
+        batch_recipes = recipes[batch].tolist()
+        current = {
+            row['recipe_id']: row
+            for row in SimilarRecipe.objects
+            .filter(recipe_id__in=batch_recipes)
+            .values('recipe_id')
+            .annotate(worst=Min('score'), count=Count('id'))
+            .order_by()
+        }
+        for recipe_id, score in zip(batch_recipes, scores[batch].tolist()):
+            row = current.get(recipe_id)
+            if (row is None or row['count'] < SIMILAR_RECIPES_LIMIT
+                    or score >= row['worst']):
+                improved.append(recipe_id)
+    return improved
+
+
+def _index_for(recipe_ids):
+    """Индекс, в котором состав рецептов recipe_ids совпадает с базой.
+
+    Версия индекса меняется после коммита, а задача видна воркеру уже
+    с коммитом, поэтому его индекс может не знать об изменении. Состав
+    рецептов задачи сверяется с базой, и расхождения применяются к индексу.
+    """
+    index = get_recipe_index()
+    stored = load_recipe_ingredients(recipe_ids)
+    changes = {
+        recipe_id: ingredient_ids
+        for recipe_id, ingredient_ids in stored.items()
+        if set(index.ingredients(recipe_id).tolist()) != ingredient_ids
+    }
+    return apply_recipe_changes(changes) if changes else index
+
+
+@register_job('refresh_similar_recipes')
+def refresh_similar_recipes(recipe_ids):
+    """Обновляет похожие после изменения состава рецептов recipe_ids.
+
+    Схожесть симметрична, поэтому пересчитываются и рецепты, в чьих
+    списках эти рецепты были или теперь должны оказаться.
+    """
+    index = _index_for(recipe_ids)
+    affected = set(recipe_ids)
+    affected.update(
+        SimilarRecipe.objects.filter(similar_id__in=recipe_ids)
+        .values_list('recipe_id', flat=True)
+    )
+    for recipe_id in recipe_ids:
+        recipes, scores = similarity_scores(
+            index, index.ingredients(recipe_id))
+        other = recipes != recipe_id
+        affected.update(_improved_recipes(recipes[other], scores[other]))
+    compute_similar_recipes(sorted(affected), index)
+
+
+def schedule_similar_recipes(recipe_ids):
+    """Ставит обновление похожих рецептов в очередь фоновых задач."""
+    recipe_ids = sorted(set(recipe_ids))
+    if recipe_ids:
+        enqueue('refresh_similar_recipes', unique=True,
+                recipe_ids=recipe_ids)
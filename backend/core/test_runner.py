@@ -0,0 +1,29 @@
+"""Запуск тестов с отдельным кешем."""
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner с файловым кешем во временном каталоге прогона.
+
+    Кеш по умолчанию общий с сервером разработки и прошлыми прогонами, а
+    TestCase не выполняет on_commit, и версии данных в тестах не меняются:
+    без отдельного кеша тест получил бы ответ, закешированный до него.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix='foodgram_test_cache')
+        self.cache_settings = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': self.cache_dir,
+        }})
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
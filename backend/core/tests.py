@@ -1,3 +1,182 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from threading import Barrier, Thread
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingCartTotal, Subscription, User
+)
+from core.shopping_cart_totals import find_mismatched_users
 
 # Тест
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAA'
+    'ACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNo'
+    'AAAAggCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+
+class RecipeIngredientQueriesTests(TestCase):
+    """Число запросов при создании рецепта не зависит от числа ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password')
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(30)
+        )
+
+    def setUp(self):
+        # TestCase не выполняет on_commit, версии данных между тестами
+        # не меняются
+        self.addCleanup(cache.clear)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, ingredient_count):
+        """Создает рецепт, возвращает запросы к таблице ингредиентов."""
+        data = {
+            'name': f'Рецепт из {ingredient_count}',
+            'text': 'Текст',
+            'cooking_time': 10,
+            'image': IMAGE,
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 10}
+                for ingredient in self.ingredients[:ingredient_count]
+            ],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(
+            len(response.data['ingredients']), ingredient_count)
+        return [
+            query['sql'] for query in queries
+            if 'FROM "core_ingredient"' in query['sql']
+        ], len(queries)
+
+    def test_query_count_does_not_depend_on_ingredient_count(self):
+        few_ingredient_queries, few_queries = self.create_recipe(2)
+        many_ingredient_queries, many_queries = self.create_recipe(30)
+        self.assertEqual(
+            len(few_ingredient_queries), len(many_ingredient_queries))
+        self.assertEqual(few_queries, many_queries)
+
+
+class ConcurrentToggleTests(TransactionTestCase):
+    """Параллельные добавления и удаления избранного, корзины и подписки.
+
+    Из одновременных одинаковых запросов успешен ровно один, а счетчики
+    и итоги корзины совпадают с числом строк.
+    """
+
+    THREADS = 8
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password')
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password')
+        self.token = Token.objects.create(user=self.user)
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст',
+            cooking_time=10, image='recipes/images/recipe.png')
+        self.flour = Ingredient.objects.create(
+            name='мука', measurement_unit='г')
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.flour, amount=100)
+
+    def run_parallel(self, method, url, data=None, token=None):
+        """Отправляет THREADS одинаковых запросов одновременно."""
+        token = token or self.token
+        barrier = Barrier(self.THREADS)
+        statuses = []
+
+        def send():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            barrier.wait()
+            try:
+                statuses.append(getattr(client, method)(
+                    url, data, format='json').status_code)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=send) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def assert_toggles(self, url, check_state):
+        statuses = self.run_parallel('post', url)
+        self.assertEqual(statuses.count(201), 1, statuses)
+        self.assertEqual(statuses.count(400), self.THREADS - 1, statuses)
+        check_state(1)
+        statuses = self.run_parallel('delete', url)
+        self.assertEqual(statuses.count(204), 1, statuses)
+        self.assertEqual(statuses.count(400), self.THREADS - 1, statuses)
+        check_state(0)
+
+    def test_favorite(self):
+        def check_state(expected):
+            self.recipe.refresh_from_db()
+            self.assertEqual(Favorite.objects.count(), expected)
+            self.assertEqual(self.recipe.favorites_count, expected)
+
+        self.assert_toggles(
+            f'/api/recipes/{self.recipe.pk}/favorite/', check_state)
+
+    def test_shopping_cart(self):
+        def check_state(expected):
+            self.assertEqual(ShoppingCart.objects.count(), expected)
+            self.assertEqual(ShoppingCartTotal.objects.count(), expected)
+            self.assertEqual(find_mismatched_users(), set())
+
+        self.assert_toggles(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/', check_state)
+
+    def test_subscribe(self):
+        def check_state(expected):
+            self.user.refresh_from_db()
+            self.author.refresh_from_db()
+            self.assertEqual(Subscription.objects.count(), expected)
+            self.assertEqual(self.user.subscriptions_count, expected)
+            self.assertEqual(self.author.subscribers_count, expected)
+
+        self.assert_toggles(
+            f'/api/users/{self.author.pk}/subscribe/', check_state)
+
+    def test_recipe_ingredients_update(self):
+        sugar = Ingredient.objects.create(name='сахар', measurement_unit='г')
+        statuses = self.run_parallel(
+            'patch', f'/api/recipes/{self.recipe.pk}/',
+            {'ingredients': [
+                {'id': self.flour.pk, 'amount': 200},
+                {'id': sugar.pk, 'amount': 50},
+            ]},
+            Token.objects.create(user=self.author))
+        self.assertEqual(statuses, [200] * self.THREADS)
+        self.assertEqual(
+            sorted(self.recipe.recipe_ingredients.values_list(
+                'ingredient__name', 'amount')),
+            [('мука', 200), ('сахар', 50)])
@@ -0,0 +1,105 @@
+"""Версии данных для инвалидации кешей и индексов в памяти."""
+from uuid import uuid4
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+VERSION_KEY = 'version:{}'
+INGREDIENTS_VERSION = 'ingredients'
+RECIPES_VERSION = 'recipes'
+RECIPE_INGREDIENTS_VERSION = 'recipe_ingredients'
+
+
+def versions_are_shared():
+    """Видят ли изменения версий другие процессы.
+
+    LocMemCache и DummyCache живут в памяти одного процесса: версию,
+    измененную командой управления или воркером, сервер не увидит.
+    """
+    return not isinstance(
+        caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def _new_version():
+    # Каждая версия уникальна: после вытеснения ключа из кеша или при
+    # одновременной смене из разных процессов она не совпадет ни с одной
+    # уже выданной
+    return uuid4().hex
+
+
+def get_version(name):
+    """Возвращает текущую версию набора данных name."""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Меняет версию набора данных name на новую.
+
+    Новое значение записывается целиком, а не увеличивается: incr
+    в файловом кеше читает и записывает значение без блокировки, и
+    одновременные увеличения теряются.
+    """
+    version = _new_version()
+    cache.set(VERSION_KEY.format(name), version, timeout=None)
+    return version
+
+
+def recipe_version_name(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def bump_recipe_versions(recipe_ids):
+    """Меняет версии списка рецептов и рецептов recipe_ids после коммита."""
+    recipe_ids = list(recipe_ids)
+
+    def bump():
+        bump_version(RECIPES_VERSION)
+        for recipe_id in recipe_ids:
+            bump_version(recipe_version_name(recipe_id))
+
+    transaction.on_commit(bump)
+
+
+def user_version_name(user_id):
+    return f'user:{user_id}'
+
+
+def bump_user_versions(user_ids):
+    """Меняет версии данных пользователей user_ids после коммита.
+
+    Версия пользователя отражает его профиль, избранное, корзину
+    и подписки.
+    """
+    user_ids = list(user_ids)
+
+    def bump():
+        for user_id in user_ids:
+            bump_version(user_version_name(user_id))
+
+    transaction.on_commit(bump)
+
+
+def auth_version_name(user_id):
+    return f'auth:{user_id}'
+
+
+def bump_auth_versions(user_ids):
+    """Сбрасывает кешированную аутентификацию пользователей после коммита.
+
+    Меняется при выходе, смене пароля и любом другом изменении учетной
+    записи, но не при изменении избранного, корзины и подписок.
+    """
+    user_ids = list(user_ids)
+
+    def bump():
+        for user_id in user_ids:
+            bump_version(auth_version_name(user_id))
+
+    transaction.on_commit(bump)